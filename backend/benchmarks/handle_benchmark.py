@@ -0,0 +1,28 @@
+'''
+handle_benchmark.py
+
+Registers thousands of users with the same name and reports how long each batch of
+registrations takes. With the handle index and suffix counters the time per registration
+should stay flat as the number of identically named users grows.
+
+Usage (from backend/):
+    python -m benchmarks.handle_benchmark [users] [batch]
+'''
+import sys
+import time
+from src.other import clear_v1
+from src.auth import auth_register_v1
+
+def main(users, batch):
+    clear_v1()
+    print(f"{'registered':>10} {'us per registration':>20}")
+    for start in range(0, users, batch):
+        started = time.perf_counter()
+        for number in range(start, start + batch):
+            auth_register_v1(f"john{number}@smith.com", "password", "john", "smith")
+        seconds = time.perf_counter() - started
+        print(f"{start + batch:>10} {seconds / batch * 1e6:>20.1f}")
+    clear_v1()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000, int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
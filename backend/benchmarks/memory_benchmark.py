@@ -0,0 +1,51 @@
+'''
+memory_benchmark.py
+
+Compares the memory the data store takes per message with users, chats and messages held as
+dicts, as the __slots__ records in src/records.py, and with each chat's messages in columns
+(src/message_columns.py), for synthetic workspaces of increasing size. Message texts are
+included, and are the same either way.
+
+Usage (from backend/):
+    python -m benchmarks.memory_benchmark [message counts...]
+'''
+import sys
+import gc
+import tracemalloc
+from src.message_columns import MessageColumns
+from benchmarks.serializer_benchmark import make_store
+
+def make_columnar_store(size):
+    store = make_store(size)
+    for chats in ("channels", "dms"):
+        for chat in store[chats].values():
+            chat["messages"] = MessageColumns(chat["messages"])
+    return store
+
+LAYOUTS = {
+    "dicts": lambda size: make_store(size, records=False),
+    "records": make_store,
+    "columns": make_columnar_store,
+}
+
+def measure(build, size):
+    '''
+    Returns the bytes held by a workspace of the given size once it's built
+    '''
+    gc.collect()
+    tracemalloc.start()
+    store = build(size)
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del store
+    return held
+
+def main(sizes):
+    print(f"{'messages':>9} {'layout':>8} {'bytes':>12} {'bytes/message':>14}")
+    for size in sizes:
+        for layout, build in LAYOUTS.items():
+            held = measure(build, size)
+            print(f"{size:>9} {layout:>8} {held:>12} {held / size:>14.1f}")
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000, 1000000])
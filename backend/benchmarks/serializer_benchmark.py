@@ -0,0 +1,87 @@
+'''
+serializer_benchmark.py
+
+Compares the size and save/load time of datastore.p as a pickle against the compact
+binary format, for synthetic workspaces of increasing size.
+
+Usage (from backend/):
+    python -m benchmarks.serializer_benchmark [message counts...]
+'''
+import sys
+import time
+import pickle
+import random
+from src import binary_format
+from src.data_store import upgrade_store
+
+USERS = 1000
+CHANNELS = 200
+DMS = 200
+MEMBERS = 50
+WORDS = ["hello", "there", "meeting", "at", "noon", "lunch", "deploy", "the", "build", "is", "green", "red"]
+
+def make_store(messages, seed=1531, records=True):
+    '''
+    Builds a workspace of USERS users spread over CHANNELS channels and DMS dms,
+    with the given number of messages split between them, held as records (or as dicts,
+    as they were before records)
+    '''
+    rng = random.Random(seed)
+    users = [{
+        'user_id': u_id,
+        'user_handle': f"user{u_id}",
+        'is_owner': u_id == 0,
+        'email': f"user{u_id}@seams.com",
+        'password': f"{u_id:064x}",
+        'name_first': f"first{u_id % 100}",
+        'name_last': f"last{u_id % 300}",
+        'sessions': ["Mon Apr 18 09:00:00 2022"],
+        'total_sessions': 1,
+        'is_active': True,
+    } for u_id in range(USERS)]
+    channels = [{'channel_id': c_id, 'name': f"channel{c_id}", 'is_public': c_id % 2 == 0}
+        for c_id in range(CHANNELS)]
+    dms = [{'dm_id': dm_id, 'name': f"dm{dm_id}"} for dm_id in range(DMS)]
+    chats = channels + dms
+    for chat in chats:
+        members = rng.sample(range(USERS), MEMBERS)
+        chat['all_members'] = dict.fromkeys(members)
+        chat['owner_members'] = dict.fromkeys(members[:2])
+        chat['messages'] = []
+    for message_id in range(messages):
+        chat = rng.choice(chats)
+        chat['messages'].append({
+            'message_id': message_id,
+            'user_id': rng.choice(list(chat['all_members'])),
+            'message': " ".join(rng.choices(WORDS, k=rng.randint(1, 12))),
+            'time_sent': 1650000000 + message_id,
+        })
+    store = {
+        'users': users,
+        'channels': {channel['channel_id']: channel for channel in channels},
+        'dms': {dm['dm_id']: dm for dm in dms},
+        'dm_count': DMS,
+        'message_count': messages,
+    }
+    if records:
+        upgrade_store(store)
+    return store
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+def main(sizes):
+    print(f"{'messages':>9} {'format':>7} {'bytes':>12} {'save ms':>9} {'load ms':>9}")
+    for size in sizes:
+        store = make_store(size)
+        for name, dumps, loads in (("pickle", pickle.dumps, pickle.loads),
+                ("binary", binary_format.dumps, binary_format.loads)):
+            data, save = timed(dumps, store)
+            loaded, load = timed(loads, data)
+            assert loaded == store
+            print(f"{size:>9} {name:>7} {len(data):>12} {save * 1000:>9.1f} {load * 1000:>9.1f}")
+
+if __name__ == "__main__":
+    main([int(size) for size in sys.argv[1:]] or [10000, 100000, 1000000])
@@ -2,6 +2,8 @@ from src.data_store import data_store
 from src.error import InputError
 from src.channel import check_valid_id
 from src.channel import user_in_channel
+from src.journal import journal
+from src.token import forget_session
 
 def num_global_owners():
     '''
@@ -16,18 +18,14 @@ def num_global_owners():
     Return Value:
         int count   - num global owners
     '''
-    store = data_store.get()
-    count = 0
-    for user in store["users"]:
-        if user["is_owner"]:
-            count += 1
+    count = data_store.global_owners()
     assert count != 0 # we have a problem otherwise...
     return count
 
 def remove_from_chat(user, chats, store):
     '''
     Given a user, type of chat (dm/channel) and the data store, removes the user from any chats 
-    they are a member of
+    they are a member or owner of
 
     Arguments:
         user            dict        - user dict from datastore of given user
@@ -37,34 +35,67 @@ def remove_from_chat(user, chats, store):
         N/A
 
     Return Value:
-        N/A
+        Returns the number of chats the user was removed from
     '''
-    for chat in store[chats]:
-        if user in chat["all_members"]:
-            chat["all_members"].remove(user)
-        if user in chat["owner_members"]:
-            chat["owner_members"].remove(user)
-
-def remove_messages(user, chats, store):
+    left = list(data_store.user_chats(chats, user["user_id"]))
+    for chat_id in left:
+        data_store.leave_chat(chats, store[chats][chat_id], user["user_id"])
+    # a dm's creator stays an owner after leaving it
+    for chat_id in list(data_store.owned_chats(chats, user["user_id"])):
+        data_store.remove_owner(chats, store[chats][chat_id], user["user_id"])
+    return len(left)
+
+def remove_messages(user):
     '''
-    Given a user, type of chat (dm/channel) and the data store, alters the contents of any messages
-    the user has sent across Seams (including chats they were previously a part of and have since left)
-    to "Removed user"
+    Given a user, alters the contents of any messages the user has sent across Seams (including
+    chats they were previously a part of and have since left) to "Removed user"
 
     Arguments:
         user            dict        - user dict from datastore of given user
-        chats           str         - "dms" or "channels"
 
     Exceptions:
         N/A
 
     Return Value:
+        Returns the number of messages rewritten
+    '''
+    rewritten = 0
+    for message_id in list(data_store.authored_messages(user["user_id"])):
+        if data_store.locate_message(message_id):
+            data_store.edit_message(message_id, "Removed user")
+            rewritten += 1
+    return rewritten
+
+def remove_user(user, store):
+    '''
+    Given a user and the data store, rewrites their messages, removes them from every chat
+    and blanks out their profile. Shared with journal replay so both stay identical.
+
+    Arguments:
+        user            dict        - user dict from datastore of given user
+        store           dict        - Database of Seams information
+
+    Exceptions:
         N/A
+
+    Return Value:
+        Returns { messages, chats }, the number of messages rewritten and chats left
     '''
-    for chat in store[chats]:
-        for message in chat["messages"]:
-            if user["user_id"] == message["user_id"]:
-                message["message"] = "Removed user"
+    messages = remove_messages(user)
+    chats = remove_from_chat(user, "dms", store) + remove_from_chat(user, "channels", store)
+
+    for session in user["sessions"]:
+        forget_session(user["user_id"], session)
+    data_store.update_user(user, {
+        "name_first": "Removed",
+        "name_last": "user",
+        "is_active": False,
+        "email": None,
+        "user_handle": None,
+        "sessions": [],
+        "is_owner": False,
+    })
+    return {"messages": messages, "chats": chats}
 
 def admin_user_remove_implement(u_id):
     '''
@@ -80,7 +111,7 @@ def admin_user_remove_implement(u_id):
         AccessError - Occurs when user is the only global owner in Seams
 
     Return Value:
-        N/A
+        Returns { messages, chats }, the number of messages rewritten and chats left
     '''
     store = data_store.get()
     user = check_valid_id(u_id, store)
@@ -89,19 +120,9 @@ def admin_user_remove_implement(u_id):
     if user["is_owner"] and num_global_owners() == 1:
         raise InputError(description="u_id refers to a user who is the only global owner")
 
-    remove_messages(user, "dms", store)
-    remove_messages(user, "channels", store)
-
-    remove_from_chat(user, "dms", store)
-    remove_from_chat(user, "channels", store)
-
-    user["name_first"] = "Removed"
-    user["name_last"] = "user"
-    user["is_active"] = False
-    user["email"] = None
-    user["user_handle"] = None
-    user["sessions"] = []
-    user["is_owner"] = False
+    removed = remove_user(user, store)
+    journal.record("user_remove", user_id=user["user_id"], user=user)
+    return removed
 
 def admin_userpermission_change_implement(u_id, permission_id):
     '''
@@ -133,7 +154,5 @@ def admin_userpermission_change_implement(u_id, permission_id):
     if (permission_id == 1 and user["is_owner"]) or (permission_id == 2 and not user["is_owner"]):
         raise InputError(description="User already has the permission level of the permission id")
       
-    if permission_id == 1:
-        user["is_owner"] = True
-    else:
-        user["is_owner"] = False
+    data_store.update_user(user, {"is_owner": permission_id == 1})
+    journal.record("user", user=user)
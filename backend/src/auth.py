@@ -1,6 +1,8 @@
 from src.data_store import data_store
 from src.error import InputError
 from src.token import encode
+from src.journal import journal
+from src.records import User
 from datetime import datetime
 import re
 
@@ -36,11 +38,7 @@ def check_email_registered(email, store):
         Returns user dict on success in finding given user
         Returns empty dict on failure in finding given user
     '''
-    for user in store["users"]:
-        if user["email"] == email:
-            return user
-    
-    return {}
+    return data_store.user_by_email(email) or {}
 
 def check_valid_name(name):
     '''
@@ -103,14 +101,7 @@ def create_new_handle(name_first, name_last, store):
     if len(new_handle) > 20:
         new_handle = new_handle[0:20]
         
-    append_number = 0
-    dupe_handle = new_handle
-    for user in store["users"]:
-        if user["user_handle"] == new_handle:
-            new_handle = f"{dupe_handle}{append_number}"
-            append_number += 1
-
-    return new_handle
+    return data_store.unique_handle(new_handle)
 
 def auth_login_v1(email, password):
     '''
@@ -137,6 +128,7 @@ def auth_login_v1(email, password):
     session = session.strftime("%c")
     user["sessions"].append(session)
     user["total_sessions"] += 1
+    journal.record("user", user=user)
 
     return {
         "token" : encode({
@@ -175,18 +167,19 @@ def auth_register_v1(email, password, name_first, name_last):
     session = datetime.now()
     session = session.strftime("%c")
 
-    store["users"].append({
-        "user_id": new_id, 
-        "user_handle" : new_handle, 
-        "is_owner" : False if new_id else True, # if user_id is 0, i.e. first user that signs up, is owner by default
-        "email" : email, 
-        "password" : password, 
-        "name_first" : name_first, 
-        "name_last" : name_last,
-        "sessions" : [session], # store datetimes that sessions were created to ensure uniqueness
-        "total_sessions" : 1,
-        "is_active" : True # switches to false when user is removed from seams
-    })
+    data_store.add_user(User(
+        user_id=new_id, 
+        user_handle=new_handle, 
+        is_owner=False if new_id else True, # if user_id is 0, i.e. first user that signs up, is owner by default
+        email=email, 
+        password=password, 
+        name_first=name_first, 
+        name_last=name_last,
+        sessions=[session], # store datetimes that sessions were created to ensure uniqueness
+        total_sessions=1,
+        is_active=True # switches to false when user is removed from seams
+    ))
+    journal.record("user", user=store["users"][new_id])
     data_store.set(store)
     return {
         "token" : encode({
@@ -0,0 +1,213 @@
+'''
+binary_format.py
+
+A compact, versioned binary encoding of the data store. Compared to pickling the nested
+dicts it:
+    - packs every message into a fixed 20 byte record (message_id, user_id, time_sent,
+      text length) instead of repeating each key string, with the chat's texts stored
+      after its records as a single utf-8 block
+    - keeps names, handles, emails, passwords, sessions and chat names in one string table
+      and refers to them by index, so repeated strings are stored once
+    - stores chat members as plain ids
+
+Layout (little endian):
+    header      MAGIC, u16 version
+    strings     u32 count, then per string: u32 length, utf-8 bytes
+    counters    i64 dm_count, i64 message_count
+    users       u32 count, then per user: USER struct, u32 sessions, i32 string index each
+    channels    u32 count, then per channel: CHANNEL struct, members, messages
+    dms         u32 count, then per dm: DM struct, members, messages
+    members     u32 owners, i64 ids, u32 members, i64 ids
+    messages    u32 count, MESSAGE struct per message (oldest first, newest first in version 1),
+                u32 length of texts in bytes, every text concatenated in utf-8
+'''
+import struct
+from src.data_store import data_store
+from src.records import User, Channel, Dm, Message
+
+MAGIC = b"SEAMS\0"
+VERSION = 2
+# versions loads() can still read
+READABLE_VERSIONS = (1, 2)
+
+COUNT = struct.Struct("<I")
+INDEX = struct.Struct("<i")
+ID = struct.Struct("<q")
+HEADER = struct.Struct(f"<{len(MAGIC)}sH")
+COUNTERS = struct.Struct("<qq")
+# user_id, handle, email, password, name_first, name_last, total_sessions, is_owner, is_active
+USER = struct.Struct("<qiiiiiq??")
+# channel_id, name, is_public
+CHANNEL = struct.Struct("<qi?")
+# dm_id, name
+DM = struct.Struct("<qi")
+# message_id, user_id, time_sent, length of text in characters
+MESSAGE = struct.Struct("<IIqI")
+
+def is_binary(data):
+    return data[:len(MAGIC)] == MAGIC
+
+class StringTable:
+    def __init__(self):
+        self.strings = []
+        self.indexes = {}
+
+    def index(self, string):
+        if string is None:
+            return -1
+        if string not in self.indexes:
+            self.indexes[string] = len(self.strings)
+            self.strings.append(string)
+        return self.indexes[string]
+
+def pack_messages(messages):
+    '''
+    Encodes a list of messages as the messages section of the layout above
+    '''
+    texts = "".join(message["message"] for message in messages).encode()
+    return b"".join([COUNT.pack(len(messages))] + [
+        MESSAGE.pack(message["message_id"], message["user_id"], message["time_sent"], len(message["message"]))
+        for message in messages
+    ] + [COUNT.pack(len(texts)), texts])
+
+def dumps(store):
+    '''
+    Encodes the store in the binary format
+
+    Arguments:
+        store       dict    - Database of Seams information
+
+    Exceptions:
+        N/A
+
+    Return Value:
+        Returns bytes
+    '''
+    table = StringTable()
+    body = []
+
+    body.append(COUNTERS.pack(store["dm_count"], store["message_count"]))
+    body.append(COUNT.pack(len(store["users"])))
+    for user in store["users"]:
+        body.append(USER.pack(user["user_id"], table.index(user["user_handle"]), table.index(user["email"]),
+            table.index(user["password"]), table.index(user["name_first"]), table.index(user["name_last"]),
+            user["total_sessions"], user["is_owner"], user["is_active"]))
+        body.append(COUNT.pack(len(user["sessions"])))
+        body.extend(INDEX.pack(table.index(session)) for session in user["sessions"])
+
+    for chats in ("channels", "dms"):
+        body.append(COUNT.pack(len(store[chats])))
+        for chat in store[chats].values():
+            if chats == "channels":
+                body.append(CHANNEL.pack(chat["channel_id"], table.index(chat["name"]), chat["is_public"]))
+            else:
+                body.append(DM.pack(chat["dm_id"], table.index(chat["name"])))
+            for members in ("owner_members", "all_members"):
+                body.append(COUNT.pack(len(chat[members])))
+                body.extend(ID.pack(u_id) for u_id in chat[members])
+            body.append(pack_messages(data_store.all_messages(chat)))
+
+    strings = [COUNT.pack(len(table.strings))]
+    for string in table.strings:
+        encoded = string.encode()
+        strings.append(COUNT.pack(len(encoded)))
+        strings.append(encoded)
+
+    return b"".join([HEADER.pack(MAGIC, VERSION)] + strings + body)
+
+class Reader:
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.offset = 0
+
+    def unpack(self, layout):
+        values = layout.unpack_from(self.data, self.offset)
+        self.offset += layout.size
+        return values
+
+    def count(self):
+        return self.unpack(COUNT)[0]
+
+    def records(self, layout, count):
+        records = layout.iter_unpack(self.data[self.offset:self.offset + layout.size * count])
+        self.offset += layout.size * count
+        return records
+
+    def text(self, length):
+        text = str(self.data[self.offset:self.offset + length], "utf-8")
+        self.offset += length
+        return text
+
+def unpack_messages(reader):
+    records = list(reader.records(MESSAGE, reader.count()))
+    texts = reader.text(reader.count())
+    messages = []
+    start = 0
+    for message_id, user_id, time_sent, length in records:
+        messages.append(Message(message_id, user_id, texts[start:start + length], time_sent))
+        start += length
+    return messages
+
+def decode_messages(data):
+    '''
+    Decodes bytes produced by pack_messages()
+    '''
+    return unpack_messages(Reader(data))
+
+def loads(data):
+    '''
+    Decodes bytes produced by dumps() back into a store
+
+    Arguments:
+        data        bytes   - Encoded store
+
+    Exceptions:
+        ValueError  - Occurs when the data isn't in the binary format or has an unknown version
+
+    Return Value:
+        Returns the store dict
+    '''
+    reader = Reader(data)
+    magic, version = reader.unpack(HEADER)
+    if magic != MAGIC:
+        raise ValueError("Not a binary datastore")
+    if version not in READABLE_VERSIONS:
+        raise ValueError(f"Unsupported binary datastore version {version}")
+
+    strings = [reader.text(reader.count()) for _ in range(reader.count())]
+    def string(index):
+        return None if index == -1 else strings[index]
+
+    dm_count, message_count = reader.unpack(COUNTERS)
+    users = []
+    for _ in range(reader.count()):
+        user_id, handle, email, password, name_first, name_last, total_sessions, is_owner, is_active = reader.unpack(USER)
+        users.append(User(
+            user_id=user_id,
+            user_handle=string(handle),
+            is_owner=is_owner,
+            email=string(email),
+            password=string(password),
+            name_first=string(name_first),
+            name_last=string(name_last),
+            sessions=[string(reader.unpack(INDEX)[0]) for _ in range(reader.count())],
+            total_sessions=total_sessions,
+            is_active=is_active,
+        ))
+
+    store = {"users": users, "channels": {}, "dms": {}, "dm_count": dm_count, "message_count": message_count}
+    for chats in ("channels", "dms"):
+        for _ in range(reader.count()):
+            if chats == "channels":
+                channel_id, name, is_public = reader.unpack(CHANNEL)
+                chat = Channel(channel_id=channel_id, name=string(name), is_public=is_public)
+            else:
+                dm_id, name = reader.unpack(DM)
+                chat = Dm(dm_id=dm_id, name=string(name))
+            for members in ("owner_members", "all_members"):
+                chat[members] = dict.fromkeys(reader.unpack(ID)[0] for _ in range(reader.count()))
+            chat["messages"] = unpack_messages(reader)
+            if version == 1:
+                chat["messages"].reverse()
+            store[chats][chat["channel_id" if chats == "channels" else "dm_id"]] = chat
+    return store
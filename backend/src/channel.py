@@ -1,13 +1,14 @@
 from src.data_store import data_store
 from src.error import InputError, AccessError
+from src.journal import journal
 
 def omit_irrelevant_keys(channel, members_string):
     '''
     Omits irrelevant keys for each user for output and returns list of members with modified users
 
     Arguments:
-        channel           dict        - Channel containing list of members
-        members_string    string      - Indicates type of members list being modified
+        channel           dict        - Channel containing members as a dict of user ids
+        members_string    string      - Indicates type of members being modified
 
     Exceptions:
         N/A
@@ -15,18 +16,7 @@ def omit_irrelevant_keys(channel, members_string):
     Return Value:
         Returns members_modified (list of users with omitted keys) on success
     '''
-    members_modified = []
-    members = channel[members_string]
-    for member in members:
-        member_modified = {
-            'u_id': member['user_id'],
-            'email': member['email'],
-            'name_first': member['name_first'],
-            'name_last': member['name_last'],
-            'handle_str': member['user_handle'],
-        }
-        members_modified.append(member_modified) 
-    return members_modified
+    return [data_store.user(member_id).profile() for member_id in channel[members_string]]
 
 def check_valid_id(auth_user_id, store):
     '''
@@ -43,9 +33,9 @@ def check_valid_id(auth_user_id, store):
         Returns user dict on success in finding given user
         Returns empty dict on failure in finding given user
     '''
-    for user in store['users']:
-        if user['user_id'] == auth_user_id and user['is_active']:
-            return user
+    user = data_store.user(auth_user_id)
+    if user and user['is_active']:
+        return user
 
     return {}
 
@@ -64,10 +54,7 @@ def user_in_channel(channel, auth_user_id):
         Returns True if user is a member of the channel
         Returns False if user is not a member of the channel
     '''
-    for user in channel["all_members"]:
-        if auth_user_id == user["user_id"]:
-            return True
-    return False
+    return auth_user_id in channel["all_members"]
 
 def get_channel(channel_id, store):
     '''
@@ -85,11 +72,7 @@ def get_channel(channel_id, store):
         Returns empty dict on failure in finding given channel
     '''
 
-    channels = store["channels"]
-    for channel in channels:
-        if channel["channel_id"] == channel_id:
-            return channel
-    return {}
+    return store["channels"].get(channel_id, {})
 
 def channel_invite_v1(auth_user_id, channel_id, u_id):
     '''
@@ -124,7 +107,8 @@ def channel_invite_v1(auth_user_id, channel_id, u_id):
     if user_in_channel(channel, u_id):
         raise InputError(description="User with u_id already a member")
     
-    channel['all_members'].append(invited_user)
+    data_store.join_chat("channels", channel, u_id)
+    journal.record("chat_join", chats="channels", chat_id=channel_id, u_id=u_id)
     data_store.set(store)
     return {}
 
@@ -190,20 +174,13 @@ def channel_messages_v1(auth_user_id, channel_id, start):
     if not user_in_channel(channel, auth_user_id):
         raise AccessError(description="User is not a member of the channel")
 
-    final_msg = len(channel["messages"])
+    final_msg = data_store.message_count(channel)
     if final_msg < start:
         raise InputError(description="Start greater than total number of messages in channel")
 
     end = start + 50 if (start + 50 < final_msg) else final_msg
 
-    message_list = []
-    for message in channel["messages"][start:end]:
-        message_list.append({
-            "message_id" : message["message_id"],
-            "u_id" : message["user_id"],
-            "message" : message["message"],
-            "time_sent" : message["time_sent"],
-        })
+    message_list = [message.output() for message in data_store.message_page(channel, start, end)]
     return {"messages" : message_list, "start" : start, "end" : end if (end == start + 50) else -1}
 
 def channel_join_v1(auth_user_id, channel_id):
@@ -235,6 +212,7 @@ def channel_join_v1(auth_user_id, channel_id):
     if user_in_channel(channel, auth_user_id):
         raise InputError(description="Already a member")
 
-    channel['all_members'].append(auth_user)
+    data_store.join_chat("channels", channel, auth_user_id)
+    journal.record("chat_join", chats="channels", chat_id=channel_id, u_id=auth_user_id)
     data_store.set(store)
     return {}
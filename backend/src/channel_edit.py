@@ -1,6 +1,7 @@
 from src.data_store import data_store
 from src.error import InputError, AccessError
 from src.channel import get_channel, user_in_channel, check_valid_id
+from src.journal import journal
 
 def channel_leave(auth_user_id, channel_id):
     '''
@@ -28,11 +29,9 @@ def channel_leave(auth_user_id, channel_id):
     if not user_in_channel(channel, auth_user_id):
         raise AccessError(description="User is not a member of the channel")
     
-    try:
-        channel['owner_members'].remove(auth_user)
-    except ValueError:
-        pass
-    channel['all_members'].remove(auth_user)
+    data_store.remove_owner("channels", channel, auth_user_id)
+    data_store.leave_chat("channels", channel, auth_user_id)
+    journal.record("chat_leave", chats="channels", chat_id=channel_id, u_id=auth_user_id)
     data_store.set(store)
     return {}
 
@@ -60,7 +59,7 @@ def channel_addowner(auth_user, channel_id, u_id):
     if not channel:
         raise InputError(description="Invalid channel")
 
-    if auth_user not in channel["owner_members"] and not auth_user["is_owner"]:
+    if auth_user["user_id"] not in channel["owner_members"] and not auth_user["is_owner"]:
         raise AccessError(description="Auth user has no owner permissions")
 
     target_user = check_valid_id(u_id, store)
@@ -70,10 +69,11 @@ def channel_addowner(auth_user, channel_id, u_id):
     if not user_in_channel(channel, u_id):
         raise InputError(description="User with u_id is not a member of the channel")
 
-    if target_user in channel["owner_members"]:
+    if u_id in channel["owner_members"]:
         raise InputError(description="User with u_id already owner")
 
-    channel['owner_members'].append(target_user)
+    data_store.add_owner("channels", channel, u_id)
+    journal.record("owner_add", chats="channels", chat_id=channel_id, u_id=u_id)
     data_store.set(store)
 
 def channel_removeowner(auth_user, channel_id, u_id):
@@ -100,18 +100,19 @@ def channel_removeowner(auth_user, channel_id, u_id):
     if not channel:
         raise InputError(description="Invalid channel")
     
-    if auth_user not in channel["owner_members"] and not auth_user["is_owner"]:
+    if auth_user["user_id"] not in channel["owner_members"] and not auth_user["is_owner"]:
         raise AccessError(description="Auth user has no owner permissions")
 
     target_user = check_valid_id(u_id, store)
     if not target_user:
         raise InputError(description="User with u_id does not refer to a valid user")
 
-    if target_user not in channel["owner_members"]:
+    if u_id not in channel["owner_members"]:
         raise InputError(description="User with u_id is no an owner of the channel")
 
-    if target_user in channel["owner_members"] and len(channel["owner_members"]) == 1:
+    if len(channel["owner_members"]) == 1:
         raise InputError(description="User with u_id is the only owner of the channel")
 
-    channel['owner_members'].remove(target_user)
+    data_store.remove_owner("channels", channel, u_id)
+    journal.record("owner_remove", chats="channels", chat_id=channel_id, u_id=u_id)
     data_store.set(store)
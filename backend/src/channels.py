@@ -2,6 +2,8 @@ from src.data_store import data_store
 from src.auth import auth_register_v1
 from src.error import InputError, AccessError
 from src.channel import check_valid_id
+from src.journal import journal
+from src.records import Channel
 
 def check_channel_name(name):
     '''
@@ -41,13 +43,11 @@ def channels_list_v1(auth_user_id):
         'channels': []
     }
     
-    for channel in store['channels']: 
-        for members in channel['all_members']: 
-            if members['user_id'] == auth_user_id:
-                member_of_channel_list['channels'].append({
-                    'channel_id' : channel['channel_id'],
-                    'name' : channel['name'],
-                })
+    for channel_id in sorted(data_store.user_chats('channels', auth_user_id)):
+        member_of_channel_list['channels'].append({
+            'channel_id' : channel_id,
+            'name' : store['channels'][channel_id]['name'],
+        })
         
     return member_of_channel_list
 
@@ -74,7 +74,7 @@ def channels_listall_v1(auth_user_id):
         'channels': []
     }
 
-    for channel in store['channels']:
+    for channel in store['channels'].values():
         all_channels_list['channels'].append({
             'channel_id' : channel['channel_id'],
             'name' : channel['name'],
@@ -104,13 +104,20 @@ def channels_create_v1(auth_user_id, name, is_public):
     check_channel_name(name)
 
     new_id = len(store['channels'])
-    store['channels'].append({
+    data_store.add_chat('channels', Channel(
+        channel_id=new_id,
+        name=name,
+        is_public=is_public,
+        owner_members={auth_user_id: None},
+        all_members={auth_user_id: None},
+        messages=[],
+    ))
+    journal.record("chat_create", chats="channels", chat={
         'channel_id': new_id,
         'name': name,
         'is_public': is_public,
-        'owner_members': [auth_user],
-        'all_members': [auth_user],
-        'messages': [],
+        'owner_members': [auth_user_id],
+        'all_members': [auth_user_id],
     })
     data_store.set(store)
     return {
@@ -0,0 +1,123 @@
+import os
+import mmap
+from src import binary_format
+from src.data_store import oldest_first, senders
+from src.journal import segment_path
+
+# start a new segment file once the current one reaches this size
+SEGMENT_BYTES = 64 * 1024 * 1024
+
+class ColdStore:
+    '''
+    Holds pages of older chat messages outside of memory. Pages are appended to segment files
+    (base.000000, base.000001, ...) in binary_format's message encoding, never rewritten, and
+    read back through mmap. A chat refers to its pages from chat["cold_pages"], oldest first,
+    each as { segment, offset, size, count, max_id, min_id, user_ids }. Changing a cold message writes a
+    replacement page, and reclaim() deletes the segments left holding only replaced pages.
+    '''
+    def __init__(self, base, page_size):
+        self.base = base
+        self.page_size = page_size
+        directory, _ = os.path.split(base)
+        os.makedirs(directory or ".", exist_ok=True)
+        self.segment = max(self.segments(), default=0)
+        self.maps = {}
+
+    def segments(self):
+        '''
+        Lists the segment numbers present on disk, in ascending order
+        '''
+        directory, prefix = os.path.split(self.base)
+        prefix += "."
+        return sorted(
+            int(name[len(prefix):]) for name in os.listdir(directory or ".")
+            if name.startswith(prefix) and name[len(prefix):].isdigit()
+        )
+
+    def write(self, messages):
+        '''
+        Appends a page of messages, synced to disk before returning since the store is about
+        to stop holding them
+
+        Arguments:
+            messages    list    - Messages to move out of memory, oldest first
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            Returns the page's reference
+        '''
+        data = binary_format.pack_messages(messages)
+        path = segment_path(self.base, self.segment)
+        if os.path.exists(path) and os.path.getsize(path) + len(data) > SEGMENT_BYTES:
+            self.segment += 1
+            path = segment_path(self.base, self.segment)
+        with open(path, "ab") as FILE:
+            offset = FILE.tell()
+            FILE.write(data)
+            FILE.flush()
+            os.fsync(FILE.fileno())
+        return {
+            "segment": self.segment,
+            "offset": offset,
+            "size": len(data),
+            "count": len(messages),
+            "max_id": messages[-1]["message_id"],
+            "min_id": messages[0]["message_id"],
+            "user_ids": sorted(senders(messages)),
+        }
+
+    def read(self, page):
+        '''
+        Returns the messages of a page written by write()
+        '''
+        end = page["offset"] + page["size"]
+        mapping = self.maps.get(page["segment"])
+        if mapping is None or len(mapping) < end:
+            # the segment has grown since it was mapped
+            if mapping is not None:
+                mapping.close()
+            with open(segment_path(self.base, page["segment"]), "rb") as FILE:
+                mapping = mmap.mmap(FILE.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[page["segment"]] = mapping
+        return oldest_first(binary_format.decode_messages(mapping[page["offset"]:end]))
+
+    def reclaim(self, pages, keep=()):
+        '''
+        Deletes every segment that none of the given pages are in, other than the one being
+        written to and those in keep, and finds the segments mostly taken up by pages that
+        aren't in use any more
+
+        Arguments:
+            pages       list    - Every page the store refers to
+            keep        set     - Segments still needed by something else, e.g. a snapshot
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            Returns the set of segments less than half in use, whose pages can be written out
+            again so that a later reclaim() deletes them
+        '''
+        used = {}
+        for page in pages:
+            used[page["segment"]] = used.get(page["segment"], 0) + page["size"]
+        sparse = set()
+        for segment in self.segments():
+            if segment == self.segment:
+                continue
+            path = segment_path(self.base, segment)
+            if segment not in used and segment not in keep:
+                mapping = self.maps.pop(segment, None)
+                if mapping is not None:
+                    mapping.close()
+                os.remove(path)
+            elif segment in used and used[segment] * 2 < os.path.getsize(path):
+                sparse.add(segment)
+        return sparse
+
+    def close(self):
+        for mapping in self.maps.values():
+            mapping.close()
+        self.maps = {}
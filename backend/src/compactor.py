@@ -0,0 +1,72 @@
+'''
+compactor.py
+
+Removing a message only marks its slot in the chat as removed (see DataStore.remove_message()),
+so a removal doesn't have to shift every newer message down. Once enough of a chat's messages
+are removed ones, its messages are rebuilt without them. With the compactor running that
+rebuild happens on this background thread instead of in the request that crossed the threshold.
+'''
+import threading
+from src.data_store import data_store
+
+compactor = None
+
+class Compactor(threading.Thread):
+    '''
+    Compacts chats as remove_message() marks them due
+    '''
+    def __init__(self):
+        super().__init__(name="compactor", daemon=True)
+        self.__stopping = False
+
+    def run(self):
+        with data_store.compaction:
+            while not self.__stopping:
+                data_store.compaction.wait()
+                data_store.compact_due()
+
+    def stop(self):
+        with data_store.compaction:
+            self.__stopping = True
+            data_store.compaction.notify()
+        self.join()
+
+def start_compactor():
+    '''
+    Starts the background compactor, after which message removals no longer compact inline
+
+    Arguments:
+        N/A
+
+    Exceptions:
+        N/A
+
+    Return Value:
+        N/A
+    '''
+    global compactor
+    if compactor is None:
+        compactor = Compactor()
+        compactor.start()
+        data_store.compact_in_background = True
+
+def stop_compactor():
+    '''
+    Stops the background compactor (if any), compacting whatever is still due
+
+    Arguments:
+        N/A
+
+    Exceptions:
+        N/A
+
+    Return Value:
+        N/A
+    '''
+    global compactor
+    if compactor is not None:
+        compactor.stop()
+        compactor = None
+    with data_store.lock:
+        data_store.compact_in_background = False
+        data_store.compact_due()
@@ -1,3 +1,52 @@
 port = 8080
 
-url = f"http://localhost:{port}/"
\ No newline at end of file
+url = f"http://localhost:{port}/"
+
+# How the data store is persisted between runs:
+#   "pickle"  - rewrite the whole store to datastore_path after every request
+#   "binary"  - as pickle, but in the compact format of src/binary_format.py
+#   "journal" - append one record per mutation to journal_path segments, replayed on top of
+#               the latest snapshot in datastore_path
+#   "sqlite"  - write only the rows each mutation touched to indexed tables in sqlite_path
+#   "sharded" - one file per channel, per dm and for users in shard_path, only touched ones are rewritten
+persistence = "pickle"
+datastore_path = "datastore.p"
+sqlite_path = "datastore.db"
+shard_path = "datastore.shards"
+# In sqlite and sharded mode, load each chat's messages when first used rather than at startup
+lazy_messages = True
+journal_path = "datastore.journal"
+# Keep only the newest hot_messages of each chat in memory (None for all of them), moving older
+# ones in pages of cold_page_size to append-only segment files at cold_path
+hot_messages = None
+cold_page_size = 500
+cold_path = "datastore.cold"
+# Chats with at least this many messages in memory hold them in columns (see message_columns.py)
+# rather than as a list of records, None to always use lists
+columnar_messages = None
+# Removed messages are only marked removed; a chat's messages are rebuilt without them once this
+# fraction of them are removed ones (None to rebuild on every removal), by a background thread
+# when compact_in_background is set
+compact_deleted = 0.25
+compact_in_background = True
+# Share one string between messages with the same short text, pooling this many of the most
+# recently used texts (None to not pool them)
+message_pool_size = 4096
+# Keep this many of the most recently used tokens decoded, so polling clients don't have their
+# token verified on every request (0 to decode every time)
+token_cache_size = 1024
+# "always" fsyncs every group commit, "everysec" at most once a second, "never" leaves it to the OS
+journal_fsync = "everysec"
+# Snapshot the store and drop the journal segments it covers every this many records
+snapshot_every = 10000
+# Write snapshots from a forked child process (like Redis' BGSAVE) so the server never pauses to
+# serialise a large store. None forks journal snapshots wherever os.fork exists, True also makes
+# pickle and binary mode write this way, False never forks (requests then wait while a snapshot
+# is pickled, only the disk write happens in the background)
+snapshot_fork = None
+
+# Hand writes to a background thread that coalesces everything changed within
+# persist_interval seconds (or persist_batch changes, whichever comes first) into one write
+persist_in_background = False
+persist_interval = 0.05
+persist_batch = 100
@@ -24,20 +24,156 @@ Example usage:
     data_store.set(store)
 '''
 
+import bisect
+import sys
+import threading
+from src.records import Record, User, Message, CHAT_RECORDS
+from src.message_columns import MessageColumns
+
 ## YOU SHOULD MODIFY THIS OBJECT BELOW
 initial_object = {
     'users': [],
-    'channels': [],
-    'dms': [],
+    'channels': {},     # channel_id -> channel, in order of creation
+    'dms': {},          # dm_id -> dm, in order of creation
     'dm_count': 0,
     'message_count': 0,
 }
 ## YOU SHOULD MODIFY THIS OBJECT ABOVE
 
 ## YOU ARE ALLOWED TO CHANGE THE BELOW IF YOU WISH
+# shard key meaning "every part of the store", see touch()
+ALL_SHARDS = "*"
+CHAT_ID = {'channels': 'channel_id', 'dms': 'dm_id'}
+# user fields shared through sys.intern, see intern_user()
+INTERNED_USER_FIELDS = ('user_handle', 'name_first', 'name_last')
+# only message texts up to this long go in the pool, see pool_messages()
+POOLED_TEXT_LENGTH = 64
+
+def normalise_email(email):
+    '''
+    Key for looking users up by email, so addresses differing only in case are the same one
+    '''
+    return email.lower()
+
+def oldest_first(messages):
+    '''
+    Puts a list of a chat's messages saved newest first, as they were before messages were
+    stored in the order they were sent, back in that order. Ids only ever increase, so the
+    ends of the list tell which way round it is.
+    '''
+    if len(messages) > 1 and messages[0]['message_id'] > messages[-1]['message_id']:
+        messages.reverse()
+    return messages
+
+def upgrade_messages(messages):
+    '''
+    Brings a chat's messages list saved by an older version up to the current layout, in place
+    '''
+    oldest_first(messages)
+    # messages used to be dicts
+    if messages and isinstance(messages[0], dict):
+        messages[:] = [Message(**message) for message in messages]
+    # removed messages saved before they were compacted away
+    if any(message['message'] is None for message in messages):
+        messages[:] = [message for message in messages if message['message'] is not None]
+    return messages
+
+def intern_user(user):
+    '''
+    Interns a user's handle and names, so first and last names many users have in common and
+    the handle the handle index is keyed by are each one string
+    '''
+    for field in INTERNED_USER_FIELDS:
+        if isinstance(user[field], str):
+            user[field] = sys.intern(user[field])
+
+def senders(messages):
+    '''
+    Returns the set of users who sent the given messages
+    '''
+    if isinstance(messages, MessageColumns):
+        return set(messages.user_ids)
+    return {message['user_id'] for message in messages}
+
+def chat_key(chat):
+    '''
+    Returns (chats, chat_id) for a channel or dm
+    '''
+    return ('channels', chat['channel_id']) if 'channel_id' in chat else ('dms', chat['dm_id'])
+
+def live_position(tombstones, live):
+    '''
+    Returns where in a chat's in memory messages its live-th message that hasn't been removed
+    is, given the ascending positions of the removed ones
+    '''
+    # tombstones[i] - i live messages come before the i-th removed one, which never decreases
+    low, high = 0, len(tombstones)
+    while low < high:
+        middle = (low + high) // 2
+        if tombstones[middle] - middle <= live:
+            low = middle + 1
+        else:
+            high = middle
+    return live + low
+
+def upgrade_store(store):
+    '''
+    Brings a store saved by an older version up to the current layout, in place
+    '''
+    # users, chats and messages used to be dicts
+    store['users'][:] = [User.from_dict(user) for user in store['users']]
+    # chats used to be held in lists
+    if isinstance(store.get('channels'), list):
+        store['channels'] = {channel['channel_id']: channel for channel in store['channels']}
+    if isinstance(store.get('dms'), list):
+        store['dms'] = {dm['dm_id']: dm for dm in store['dms']}
+    # and their members in lists of user dicts (or user ids, in shard files)
+    for chats in ('channels', 'dms'):
+        for chat_id, chat in store.get(chats, {}).items():
+            for members in ('owner_members', 'all_members'):
+                if isinstance(chat[members], list):
+                    chat[members] = dict.fromkeys(
+                        member['user_id'] if isinstance(member, (dict, Record)) else member for member in chat[members]
+                    )
+            # and their messages (and cold pages) newest first
+            if 'messages' in chat:
+                upgrade_messages(chat['messages'])
+            pages = chat.get('cold_pages', [])
+            if len(pages) > 1 and pages[0]['min_id'] > pages[-1]['min_id']:
+                pages.reverse()
+            store[chats][chat_id] = CHAT_RECORDS[chats].from_dict(chat)
+
 class Datastore:
     def __init__(self):
         self.__store = initial_object
+        self.__generation = 0
+        self.__dirty = set()
+        # set when startup defers loading chat messages until they're first needed
+        self.message_loader = None
+        self.message_locator = None
+        self.deferred_chats = 0
+        self.materialised_chats = 0
+        # set when older messages are moved out of memory, see tier_messages()
+        self.cold = None
+        self.hot_messages = None
+        # set when big chats hold their messages in columns, see columnar_messages()
+        self.columns_from = None
+        # held by each request, and by persistence while it snapshots the store
+        self.lock = threading.RLock()
+        # see remove_message() and compact_deleted()
+        self.compact_ratio = None
+        self.compact_in_background = False
+        self.compaction = threading.Condition(self.lock)
+        # text -> itself for the most recently used short message texts, see pool_messages()
+        self.pool_size = None
+        self.__texts = {}
+        self.__indexed = None
+        self.__users_by_id = {}
+        self.__users_by_email = {}
+        self.__users_by_handle = {}
+        # base handle -> every base + str(n) below this is taken, see unique_handle()
+        self.__next_suffix = {}
+        self.reindex()
 
     def get(self):
         return self.__store
@@ -45,7 +181,693 @@ class Datastore:
     def set(self, store):
         if not isinstance(store, dict):
             raise TypeError('store must be of type dictionary')
-        self.__store = store
+        if store is self.__store:
+            self.touch()
+        else:
+            upgrade_store(store)
+            self.__store = store
+            self.touch(ALL_SHARDS)
+        # a new store, or clear_v1 swapping in fresh lists
+        if any(indexed is not store.get(key) for key, indexed in zip(('users', 'channels', 'dms'), self.__indexed)):
+            self.reindex()
+
+    def reindex(self):
+        '''
+        Rebuilds the lookup indexes from the store's contents
+        '''
+        self.__indexed = (self.__store['users'], self.__store['channels'], self.__store['dms'])
+        self.__users_by_id = {}
+        self.__users_by_email = {}
+        self.__users_by_handle = {}
+        self.__next_suffix = {}
+        self.__global_owners = 0
+        for user in self.__store['users']:
+            intern_user(user)
+            self.__index_user(user)
+            self.__global_owners += user['is_owner']
+        # chats -> user_id -> ids of the chats they're a member of / an owner of
+        self.__memberships = {'channels': {}, 'dms': {}}
+        self.__ownerships = {'channels': {}, 'dms': {}}
+        # message_id -> (chats, chat_id, sender) and user_id -> ids of the messages they sent,
+        # filled in from chats not wholly in memory on first miss
+        self.__message_chats = {}
+        self.__authored = {}
+        self.__unindexed_chats = set()
+        # (chats, chat_id) -> ascending positions of removed messages in chat["messages"]
+        self.__tombstones = {}
+        self.__compaction_due = set()
+        for chats in self.__memberships:
+            for chat_id, chat in self.__store[chats].items():
+                self.__index_chat(chats, chat)
+                self.__fit_messages(chat)
+                if 'messages' in chat:
+                    self.__pool_texts(chat['messages'])
+                if 'messages' in chat and not chat.get('cold_pages'):
+                    for position, message in enumerate(chat['messages']):
+                        if message['message'] is None:
+                            self.__tombstones.setdefault((chats, chat_id), []).append(position)
+                        else:
+                            self.__index_message(chats, chat_id, message)
+                else:
+                    self.__unindexed_chats.add((chats, chat_id))
+
+    def __index_user(self, user):
+        self.__users_by_id[user['user_id']] = user
+        if user['email'] is not None:
+            self.__users_by_email[normalise_email(user['email'])] = user
+        if user['user_handle'] is not None:
+            self.__users_by_handle[user['user_handle']] = user
+
+    def add_user(self, user):
+        '''
+        Appends a newly registered user to the store and indexes it
+        '''
+        intern_user(user)
+        self.__store['users'].append(user)
+        self.__index_user(user)
+        self.__global_owners += user['is_owner']
+
+    def update_user(self, user, changes):
+        '''
+        Updates fields of a user, keeping the indexes on them up to date. Emails, handles, names
+        and global owner permissions should only ever be changed through here.
+
+        Arguments:
+            user        dict    - User dict held in the store
+            changes     dict    - Fields to change and their new values
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            N/A
+        '''
+        if user['email'] is not None and self.__users_by_email.get(normalise_email(user['email'])) is user:
+            del self.__users_by_email[normalise_email(user['email'])]
+        handle = user['user_handle']
+        if handle is not None and self.__users_by_handle.get(handle) is user and changes.get('user_handle', handle) != handle:
+            del self.__users_by_handle[handle]
+            self.__free_handle(handle)
+        self.__global_owners -= user['is_owner']
+        user.update(changes)
+        intern_user(user)
+        self.__index_user(user)
+        self.__global_owners += user['is_owner']
+
+    def user(self, user_id):
+        '''
+        Returns the user with the given id (active or removed), or None if there isn't one
+        '''
+        return self.__users_by_id.get(user_id)
+
+    def global_owners(self):
+        '''
+        Returns the number of users with global owner permissions
+        '''
+        return self.__global_owners
+
+    def user_by_email(self, email):
+        '''
+        Returns the user registered with the given email (in any case), or None if there isn't one
+        '''
+        return self.__users_by_email.get(normalise_email(email))
+
+    def add_chat(self, chats, chat):
+        '''
+        Adds a new channel or dm to the store, indexing its members
+
+        Arguments:
+            chats       str     - "channels" or "dms"
+            chat        dict    - The new chat
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            N/A
+        '''
+        self.__store[chats][chat[CHAT_ID[chats]]] = chat
+        self.__index_chat(chats, chat)
+
+    def __index_chat(self, chats, chat):
+        chat_id = chat[CHAT_ID[chats]]
+        for u_id in chat['all_members']:
+            self.__memberships[chats].setdefault(u_id, {})[chat_id] = None
+        for u_id in chat['owner_members']:
+            self.__ownerships[chats].setdefault(u_id, {})[chat_id] = None
+
+    def remove_chat(self, chats, chat_id):
+        chat = self.__store[chats].pop(chat_id)
+        for u_id in chat['all_members']:
+            self.__memberships[chats][u_id].pop(chat_id, None)
+        for u_id in chat['owner_members']:
+            self.__ownerships[chats][u_id].pop(chat_id, None)
+        # ids of messages not in memory are dropped by locate_message() when next looked up
+        for message in chat.get('messages', ()):
+            self.__unindex_message(message['message_id'])
+        self.__unindexed_chats.discard((chats, chat_id))
+        self.__tombstones.pop((chats, chat_id), None)
+        self.__compaction_due.discard((chats, chat_id))
+
+    def join_chat(self, chats, chat, u_id):
+        '''
+        Adds a user to a chat's members. Membership should only ever change through here and
+        leave_chat(), which keep user_chats() up to date.
+        '''
+        chat['all_members'][u_id] = None
+        self.__memberships[chats].setdefault(u_id, {})[chat[CHAT_ID[chats]]] = None
+
+    def leave_chat(self, chats, chat, u_id):
+        del chat['all_members'][u_id]
+        self.__memberships[chats][u_id].pop(chat[CHAT_ID[chats]], None)
+
+    def user_chats(self, chats, u_id):
+        '''
+        Returns the ids of the channels or dms a user is a member of, in the order they joined
+        '''
+        return self.__memberships[chats].get(u_id, {})
+
+    def add_owner(self, chats, chat, u_id):
+        '''
+        Makes a user an owner of a chat. Ownership should only ever change through here and
+        remove_owner(), which keep owned_chats() up to date.
+        '''
+        chat['owner_members'][u_id] = None
+        self.__ownerships[chats].setdefault(u_id, {})[chat[CHAT_ID[chats]]] = None
+
+    def remove_owner(self, chats, chat, u_id):
+        if u_id in chat['owner_members']:
+            del chat['owner_members'][u_id]
+            self.__ownerships[chats][u_id].pop(chat[CHAT_ID[chats]], None)
+
+    def owned_chats(self, chats, u_id):
+        '''
+        Returns the ids of the channels or dms a user is an owner of, which for a dm's creator
+        includes dms they've since left
+        '''
+        return self.__ownerships[chats].get(u_id, {})
+
+    def user_by_handle(self, handle):
+        '''
+        Returns the user with the given handle, or None if there isn't one
+        '''
+        return self.__users_by_handle.get(handle)
+
+    def unique_handle(self, base):
+        '''
+        Returns base if no one has it as their handle, otherwise base followed by the smallest
+        number (from 0) that makes an unused handle. A counter per base remembers how far the
+        taken numbers go, so this stays constant time however many users share a name.
+
+        Arguments:
+            base        str     - Handle made from the user's names
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            Returns the handle
+        '''
+        if base not in self.__users_by_handle:
+            return base
+        suffix = self.__next_suffix.get(base, 0)
+        while f"{base}{suffix}" in self.__users_by_handle:
+            suffix += 1
+        self.__next_suffix[base] = suffix
+        return f"{base}{suffix}"
+
+    def __free_handle(self, handle):
+        # handle may be any base followed by a number, so wind back every counter it could lower
+        for split in range(len(handle) - 1, 0, -1):
+            suffix = handle[split:]
+            if not (suffix.isascii() and suffix.isdigit()):
+                break
+            base = handle[:split]
+            if str(int(suffix)) == suffix and int(suffix) < self.__next_suffix.get(base, 0):
+                self.__next_suffix[base] = int(suffix)
+
+    def touch(self, *shards):
+        '''
+        Marks the store as changed. Called for every mutation, including in-place edits of
+        dicts handed out by get(), so persistence can tell when there is nothing new to save.
+        Shards name the parts that changed ("users", "counters", ("channels", 7), ...) so
+        sharded persistence only rewrites those.
+        '''
+        self.__generation += 1
+        self.__dirty.update(shards)
+
+    def take_dirty(self):
+        '''
+        Returns the set of shards touched since the last call, and starts a new one
+        '''
+        dirty = self.__dirty
+        self.__dirty = set()
+        return dirty
+
+    def defer_messages(self, loader, chats, locator=None):
+        '''
+        Registers how to load a chat's messages for chats that were loaded without them
+
+        Arguments:
+            loader      function    - Given a chat dict, returns its messages list
+            chats       int         - Number of chats whose messages were deferred
+            locator     object      - Optional, narrows down which of those chats to load when
+                                      looking for a message or a user's messages, through
+                                      message_chats(message_id) and authored_chats(u_id), each
+                                      returning the (chats, chat_id) that may hold them
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            N/A
+        '''
+        self.message_loader = loader
+        self.message_locator = locator
+        self.deferred_chats = chats
+        self.materialised_chats = 0
+
+    def tier_messages(self, cold, hot_messages):
+        '''
+        Keeps only the newest hot_messages of each chat in memory, moving older ones out to
+        pages in the cold store as chats grow
+
+        Arguments:
+            cold            ColdStore   - Where older pages of messages go, None to turn tiering off
+            hot_messages    int         - Number of messages per chat kept in memory
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            N/A
+        '''
+        self.cold = cold
+        self.hot_messages = hot_messages
+
+    def columnar_messages(self, columns_from):
+        '''
+        Has chats hold their messages in MessageColumns rather than a list of records once they
+        have columns_from messages in memory
+
+        Arguments:
+            columns_from    int     - Number of messages from which a chat uses columns, None
+                                      to always use lists
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            N/A
+        '''
+        self.columns_from = columns_from
+
+    def pool_messages(self, pool_size):
+        '''
+        Has messages with the same short text share one string, in memory and in pickled
+        snapshots, e.g. "ok", "+1" or the "Removed user" every message of a removed user becomes
+
+        Arguments:
+            pool_size   int     - Number of most recently used texts to keep in the pool, None
+                                  to not pool texts
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            N/A
+        '''
+        self.pool_size = pool_size
+        self.__texts = {}
+
+    def pooled_text(self, text):
+        '''
+        Returns the pooled string equal to text, adding text to the pool if there isn't one
+        '''
+        if not self.pool_size or text is None or len(text) > POOLED_TEXT_LENGTH:
+            return text
+        # reinserting keeps the pool in least to most recently used order
+        pooled = self.__texts.pop(text, text)
+        self.__texts[pooled] = pooled
+        if len(self.__texts) > self.pool_size:
+            del self.__texts[next(iter(self.__texts))]
+        return pooled
+
+    def __pool_texts(self, messages):
+        if not self.pool_size:
+            return
+        if isinstance(messages, MessageColumns):
+            messages.texts[:] = map(self.pooled_text, messages.texts)
+            return
+        for message in messages:
+            message['message'] = self.pooled_text(message['message'])
+
+    def __fit_messages(self, chat):
+        if self.columns_from is None or isinstance(chat.get("messages"), (MessageColumns, type(None))):
+            return
+        if len(chat["messages"]) >= self.columns_from:
+            chat["messages"] = MessageColumns(chat["messages"])
+
+    def recent_messages(self, chat):
+        '''
+        Returns the in memory (newest) part of a chat's messages, loading it the first time if
+        startup deferred it. Messages are held oldest first, in the order they were sent.
+        '''
+        if "messages" not in chat:
+            chat["messages"] = upgrade_messages(self.message_loader(chat))
+            self.materialised_chats += 1
+            self.__pool_texts(chat["messages"])
+            self.__fit_messages(chat)
+        return chat["messages"]
+
+    def messages(self, chat):
+        '''
+        Returns a chat's complete messages list (oldest first), pulling any pages moved to the
+        cold store back into memory. All other access to chat["messages"] should go through here.
+        '''
+        messages = self.recent_messages(chat)
+        if chat.get("cold_pages"):
+            older = [message for page in chat.pop("cold_pages") for message in self.cold.read(page)]
+            messages[:0] = older
+            tombstones = self.__tombstones.get(chat_key(chat))
+            if tombstones:
+                tombstones[:] = [position + len(older) for position in tombstones]
+        return messages
+
+    def cold_page(self, chat, message_id):
+        '''
+        Returns the position in chat["cold_pages"] of the page holding message_id, or None if
+        the message isn't in a cold page
+        '''
+        pages = chat.get("cold_pages", ())
+        low, high = 0, len(pages)
+        while low < high:
+            middle = (low + high) // 2
+            if pages[middle]["max_id"] < message_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(pages) and pages[low]["min_id"] <= message_id:
+            return low
+        return None
+
+    def __rewrite_page(self, chat, page, messages):
+        # cold pages are never changed in place, a replacement page takes the old one's place
+        if messages:
+            chat["cold_pages"][page] = self.cold.write(messages)
+        else:
+            del chat["cold_pages"][page]
+
+    def message_count(self, chat):
+        '''
+        Returns the number of messages in a chat, not counting removed ones
+        '''
+        removed = len(self.__tombstones.get(chat_key(chat), ()))
+        return len(self.recent_messages(chat)) - removed + sum(page["count"] for page in chat.get("cold_pages", ()))
+
+    def message_page(self, chat, start, end):
+        '''
+        Returns messages start to end of a chat's complete history counting back from the
+        newest, newest first, reading only the cold pages that range reaches into and leaving
+        them out of memory. Removed messages aren't counted, so a page is always full.
+        '''
+        total = self.message_count(chat)
+        # the same range counted from the oldest
+        low, high = max(total - end, 0), total - start
+        result = []
+        offset = 0
+        for page in chat.get("cold_pages", ()):
+            if offset >= high:
+                break
+            if offset + page["count"] > low:
+                result.extend(self.cold.read(page)[max(low - offset, 0):high - offset])
+            offset += page["count"]
+        first, last = max(low - offset, 0), max(high - offset, 0)
+        tombstones = self.__tombstones.get(chat_key(chat))
+        if tombstones:
+            first, last = live_position(tombstones, first), live_position(tombstones, last)
+            result.extend(message for message in self.recent_messages(chat)[first:last] if message["message"] is not None)
+        else:
+            result.extend(self.recent_messages(chat)[first:last])
+        result.reverse()
+        return result
+
+    def all_messages(self, chat):
+        '''
+        Returns a chat's complete history, oldest first, leaving cold pages out of memory
+        '''
+        older = [message for page in chat.get("cold_pages", ()) for message in self.cold.read(page)]
+        if chat_key(chat) in self.__tombstones:
+            older.extend(message for message in self.recent_messages(chat) if message["message"] is not None)
+        else:
+            older.extend(self.recent_messages(chat))
+        return older
+
+    def add_message(self, chats, chat, message):
+        '''
+        Appends a newly sent message to a chat's messages and indexes it. All new messages
+        should go through here.
+        '''
+        message["message"] = self.pooled_text(message["message"])
+        self.recent_messages(chat).append(message)
+        self.__index_message(chats, chat[CHAT_ID[chats]], message)
+        self.spill(chat)
+        self.__fit_messages(chat)
+
+    def __index_message(self, chats, chat_id, message):
+        self.__message_chats[message['message_id']] = (chats, chat_id, message['user_id'])
+        self.__authored.setdefault(message['user_id'], {})[message['message_id']] = None
+
+    def __unindex_message(self, message_id):
+        location = self.__message_chats.pop(message_id, None)
+        if location is not None:
+            self.__authored[location[2]].pop(message_id, None)
+
+    def locate_message(self, message_id):
+        '''
+        Finds a message from its id alone: the chat comes from the message index and the
+        message's place in it from a binary search, since a chat's messages are always in
+        ascending id order
+
+        Arguments:
+            message_id  int     - Id of the message
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            Returns (chats, chat, messages, index) where messages[index] is the message,
+            or None if there is no such message. For a message in a cold page, messages is
+            just that page's messages.
+        '''
+        location = self.__find_message(message_id)
+        return location and location[:4]
+
+    def __find_message(self, message_id):
+        # locate_message(), along with the position of the cold page the message is in
+        location = self.__message_chats.get(message_id)
+        if location is None and self.__unindexed_chats:
+            self.__index_messages(self.__unindexed_holding(message_id))
+            location = self.__message_chats.get(message_id)
+        if location is None:
+            return None
+        chats, chat_id = location[:2]
+        chat = self.__store[chats].get(chat_id)
+        page = None if chat is None else self.cold_page(chat, message_id)
+        if page is not None:
+            messages = self.cold.read(chat["cold_pages"][page])
+        else:
+            messages = [] if chat is None else self.recent_messages(chat)
+        low, high = 0, len(messages)
+        while low < high:
+            middle = (low + high) // 2
+            if messages[middle]['message_id'] < message_id:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(messages) or messages[low]['message_id'] != message_id:
+            # left behind by a removed chat
+            self.__unindex_message(message_id)
+            return None
+        return chats, chat, messages, low, page
+
+    def remove_message(self, message_id):
+        '''
+        Removes a message. Rather than shifting every later message down, its slot is marked
+        removed (its text set to None) and skipped from then on, and the chat's messages are
+        compacted once compact_ratio of them are removed ones. A message in a cold page is
+        removed from a replacement page straight away.
+        '''
+        chats, chat, messages, index, page = self.__find_message(message_id)
+        self.__unindex_message(message_id)
+        if page is not None:
+            del messages[index]
+            self.__rewrite_page(chat, page, messages)
+            return
+        message = messages[index]
+        message["message"] = None
+        messages[index] = message
+        key = (chats, chat[CHAT_ID[chats]])
+        tombstones = self.__tombstones.setdefault(key, [])
+        bisect.insort(tombstones, index)
+        if self.compact_ratio is None or len(tombstones) >= self.compact_ratio * len(messages):
+            self.__compaction_due.add(key)
+            if not self.compact_in_background:
+                self.compact_due()
+                return
+            with self.compaction:
+                self.compaction.notify()
+
+    def compact_deleted(self, ratio):
+        '''
+        Sets how many of a chat's in memory messages have to be removed ones before it's compacted
+
+        Arguments:
+            ratio       float   - Fraction of removed messages, None to compact on every removal
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            N/A
+        '''
+        self.compact_ratio = ratio
+
+    def compact_due(self):
+        '''
+        Rebuilds the messages of every chat that has built up enough removed ones without them.
+        Run by the compactor thread when there is one, otherwise by remove_message().
+        '''
+        for chats, chat_id in self.__compaction_due:
+            self.__compact(chats, self.__store[chats][chat_id])
+        self.__compaction_due = set()
+
+    def __compact(self, chats, chat):
+        if self.__tombstones.pop((chats, chat[CHAT_ID[chats]]), None):
+            messages = chat["messages"]
+            messages[:] = [message for message in messages if message["message"] is not None]
+
+    def edit_message(self, message_id, text):
+        '''
+        Changes a message's text. Edits should go through here, as a message read from a chat
+        held in columns, or in a cold page, is only a copy.
+        '''
+        chats, chat, messages, index, page = self.__find_message(message_id)
+        message = messages[index]
+        message["message"] = self.pooled_text(text)
+        messages[index] = message
+        if page is not None:
+            self.__rewrite_page(chat, page, messages)
+
+    def authored_messages(self, u_id):
+        '''
+        Returns the ids of the messages a user has sent that haven't been removed, across every
+        channel and dm including ones they've since left
+        '''
+        if self.__unindexed_chats:
+            self.__index_messages(self.__unindexed_authored(u_id))
+        return self.__authored.get(u_id, {})
+
+    def __index_messages(self, keys):
+        for chats, chat_id in keys:
+            chat = self.__store[chats].get(chat_id)
+            if chat is not None:
+                for message in self.all_messages(chat):
+                    self.__index_message(chats, chat_id, message)
+        self.__unindexed_chats -= keys
+
+    def __unindexed_holding(self, message_id):
+        # the chats not indexed yet that may hold message_id, going by their cold pages' and
+        # in memory messages' ids, and the message locator for chats whose messages aren't loaded
+        found, unloaded = set(), set()
+        for chats, chat_id in self.__unindexed_chats:
+            chat = self.__store[chats].get(chat_id)
+            if chat is None:
+                continue
+            if self.cold_page(chat, message_id) is not None:
+                found.add((chats, chat_id))
+            elif "messages" not in chat:
+                unloaded.add((chats, chat_id))
+            elif chat["messages"] and chat["messages"][0]["message_id"] <= message_id <= chat["messages"][-1]["message_id"]:
+                found.add((chats, chat_id))
+        if unloaded and self.message_locator is not None:
+            unloaded.intersection_update(self.message_locator.message_chats(message_id))
+        return found | unloaded
+
+    def __unindexed_authored(self, u_id):
+        # the chats not indexed yet that u_id may have sent messages in, as __unindexed_holding()
+        found, unloaded = set(), set()
+        for chats, chat_id in self.__unindexed_chats:
+            chat = self.__store[chats].get(chat_id)
+            if chat is None:
+                continue
+            # pages written before they listed their senders may hold anyone's messages
+            if any(u_id in page.get("user_ids", (u_id,)) for page in chat.get("cold_pages", ())):
+                found.add((chats, chat_id))
+            elif "messages" not in chat:
+                unloaded.add((chats, chat_id))
+            elif u_id in senders(chat["messages"]):
+                found.add((chats, chat_id))
+        if unloaded and self.message_locator is not None:
+            unloaded.intersection_update(self.message_locator.authored_chats(u_id))
+        return found | unloaded
+
+    def spill(self, chat):
+        '''
+        Moves the chat's oldest in memory messages to pages of at most cold.page_size in the
+        cold store, once it holds a page worth more than hot_messages
+        '''
+        if self.cold is None:
+            return
+        messages = chat["messages"]
+        if len(messages) < self.hot_messages + self.cold.page_size:
+            return
+        # pages only ever hold messages that haven't been removed
+        chats, chat_id = chat_key(chat)
+        self.__compact(chats, chat)
+        self.__compaction_due.discard((chats, chat_id))
+        if len(messages) < self.hot_messages + self.cold.page_size:
+            return
+        cut = len(messages) - self.hot_messages
+        pages = chat.setdefault("cold_pages", [])
+        for start in range(0, cut, self.cold.page_size):
+            pages.append(self.cold.write(messages[start:min(start + self.cold.page_size, cut)]))
+        del messages[:cut]
+
+    def reclaim_cold(self, keep=()):
+        '''
+        Frees cold store space taken up by pages that were replaced when a cold message was
+        edited or removed. Segments no chat refers to any more are deleted, and the pages still
+        in use in mostly replaced segments are written out again, so that those segments go
+        the next time round. Only safe at startup, while the pages the store refers to are the
+        ones persisted.
+
+        Arguments:
+            keep        set     - Segments to keep regardless, e.g. ones a journal snapshot
+                                  refers to
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            N/A
+        '''
+        chats_pages = [
+            (chats, chat) for chats in self.__memberships for chat in self.__store[chats].values()
+            if chat.get("cold_pages")
+        ]
+        sparse = self.cold.reclaim([page for _, chat in chats_pages for page in chat["cold_pages"]], keep)
+        for chats, chat in chats_pages:
+            pages = chat["cold_pages"]
+            moved = [number for number, page in enumerate(pages) if page["segment"] in sparse]
+            for number in moved:
+                pages[number] = self.cold.write(self.cold.read(pages[number]))
+            if moved:
+                self.touch((chats, chat[CHAT_ID[chats]]))
+
+    @property
+    def generation(self):
+        return self.__generation
 
 print('Loading Datastore...')
 
@@ -1,6 +1,8 @@
 from src.data_store import data_store
 from src.error import InputError, AccessError
 from src.channel import check_valid_id, omit_irrelevant_keys
+from src.journal import journal
+from src.records import Dm, Message
 from datetime import timezone
 import datetime
 
@@ -41,11 +43,7 @@ def get_dm(dm_id, store):
         Returns empty dict on failure in finding given dm
     ''' 
 
-    dms = store["dms"]
-    for dm in dms:
-        if dm["dm_id"] == dm_id:
-            return dm
-    return {}
+    return store["dms"].get(dm_id, {})
 
 def dm_create(user, u_ids):
     '''
@@ -74,16 +72,20 @@ def dm_create(user, u_ids):
 
     new_id = store['dm_count']
     store['dm_count'] += 1
-    dm = {
+    dm = Dm(
+        dm_id=new_id,
+        name=name,
+        owner_members={user['user_id']: None},
+        all_members=dict.fromkeys([user['user_id']] + u_ids),
+        messages=[],
+    )
+    data_store.add_chat("dms", dm)
+    journal.record("chat_create", chats="dms", chat={
         'dm_id': new_id,
         'name': name,
-        'owner_members': [user],
-        'all_members': [user],
-        'messages': [],
-    }
-    for u_id in u_ids:
-        dm["all_members"].append(check_valid_id(u_id, store))
-    store['dms'].append(dm)
+        'owner_members': [user['user_id']],
+        'all_members': [user['user_id']] + u_ids,
+    })
     data_store.set(store)
     return {
         'dm_id': new_id,
@@ -108,13 +110,11 @@ def dm_list(auth_user_id):
     member_of_dm_list = {
         'dms': []
     }
-    for dm in store['dms']:
-        for members in dm['all_members']:
-            if members['user_id'] == auth_user_id:
-                member_of_dm_list['dms'].append({
-                    'dm_id': dm['dm_id'],
-                    'name': dm['name'],
-                })
+    for dm_id in sorted(data_store.user_chats('dms', auth_user_id)):
+        member_of_dm_list['dms'].append({
+            'dm_id': dm_id,
+            'name': store['dms'][dm_id]['name'],
+        })
     
     return member_of_dm_list
 
@@ -137,17 +137,18 @@ def dm_remove(user, dm_id):
     '''
     store = data_store.get()
 
-    for dm in store['dms']:
-        if dm['dm_id'] == dm_id:
-            if user in dm['owner_members'] and user in dm['all_members']:
-                store['dms'].remove(dm)
-                data_store.set(store)
-                return {}
-            if user in dm['owner_members']:
-                raise AccessError(description="Authorised user is no longer in the DM")
-            else:
-                raise AccessError(description="Authorised user is not the original creator")
-    raise InputError(description="DM with dm_id is not valid")
+    dm = get_dm(dm_id, store)
+    if not dm:
+        raise InputError(description="DM with dm_id is not valid")
+    if user['user_id'] in dm['owner_members'] and user['user_id'] in dm['all_members']:
+        data_store.remove_chat("dms", dm_id)
+        journal.record("chat_remove", chats="dms", chat_id=dm_id)
+        data_store.set(store)
+        return {}
+    if user['user_id'] in dm['owner_members']:
+        raise AccessError(description="Authorised user is no longer in the DM")
+    else:
+        raise AccessError(description="Authorised user is not the original creator")
 
 def dm_details(auth_user_id, dm_id):
     
@@ -168,18 +169,16 @@ def dm_details(auth_user_id, dm_id):
 
     store = data_store.get()
 
-    for dm in store['dms']:
-        if dm['dm_id'] == dm_id:
-            for user in dm['all_members']:
-                if user['user_id'] == auth_user_id:
-                    members = omit_irrelevant_keys(dm, "all_members")
-                    return {
-                        'name': dm['name'],
-                        'members': members
-                    }
-            raise AccessError(description="Authorised user is not a member")
-    
-    raise InputError(description="Invalid dm_id")
+    dm = get_dm(dm_id, store)
+    if not dm:
+        raise InputError(description="Invalid dm_id")
+    if auth_user_id in dm['all_members']:
+        members = omit_irrelevant_keys(dm, "all_members")
+        return {
+            'name': dm['name'],
+            'members': members
+        }
+    raise AccessError(description="Authorised user is not a member")
 
 def dm_leave(auth_user_id, dm_id):
     '''
@@ -206,7 +205,8 @@ def dm_leave(auth_user_id, dm_id):
     if not user_in_dm(dm, auth_user_id):
         raise AccessError(description="User is not a member of the DM")
     
-    dm['all_members'].remove(auth_user)
+    data_store.leave_chat("dms", dm, auth_user_id)
+    journal.record("chat_leave", chats="dms", chat_id=dm_id, u_id=auth_user_id)
     data_store.set(store)
     return {}
 
@@ -225,10 +225,7 @@ def user_in_dm(dm, auth_user_id):
         Returns True if user is a member of the dm
         Returns False if user is not a member of the dm
     '''
-    for user in dm["all_members"]:
-        if auth_user_id == user["user_id"]:
-            return True
-    return False
+    return auth_user_id in dm["all_members"]
 
 def dm_messages(auth_user_id, dm_id, start):
     '''
@@ -259,20 +256,13 @@ def dm_messages(auth_user_id, dm_id, start):
     if not user_in_dm(dm, auth_user_id):
         raise AccessError(description="User is not a member of the dm")
 
-    final_msg = len(dm["messages"])
+    final_msg = data_store.message_count(dm)
     if final_msg < start:
         raise InputError(description="Start greater than total number of messages in dm")
 
     end = start + 50 if (start + 50 < final_msg) else final_msg
 
-    message_list = []
-    for message in dm["messages"][start:end]:
-        message_list.append({
-            "message_id" : message["message_id"],
-            "u_id" : message["user_id"],
-            "message" : message["message"],
-            "time_sent" : message["time_sent"],
-        })
+    message_list = [message.output() for message in data_store.message_page(dm, start, end)]
     return {"messages" : message_list, "start" : start, "end" : end if (end == start + 50) else -1}
 
 
@@ -309,15 +299,14 @@ def message_senddm(auth_user_id, dm_id, message):
 
     new_id = store['message_count']
     store['message_count'] += 1
-    dm["messages"].insert(
-        0,
-        {
-            'message_id': new_id,
-            'user_id': auth_user_id,
-            'message': message,
-            'time_sent': int(datetime.datetime.now(timezone.utc).replace(tzinfo=timezone.utc).timestamp()),
-        }
+    sent = Message(
+        message_id=new_id,
+        user_id=auth_user_id,
+        message=message,
+        time_sent=int(datetime.datetime.now(timezone.utc).replace(tzinfo=timezone.utc).timestamp()),
     )
+    data_store.add_message("dms", dm, sent)
+    journal.record("message_send", chats="dms", chat_id=dm_id, message=sent)
     data_store.set(store)
     return { 'message_id': new_id }
     
@@ -0,0 +1,199 @@
+import os
+import re
+import json
+import time
+import threading
+from src import config
+from src.data_store import data_store
+from src.shards import shards_touched
+from src.records import to_json
+
+FSYNC_POLICIES = ("always", "everysec", "never")
+
+def segment_path(base, segment):
+    return f"{base}.{segment:06d}"
+
+class Journal:
+    def __init__(self):
+        self.enabled = False
+        self.base = config.journal_path
+        self.segment = 1
+        self.records = 0
+        self.fsync = config.journal_fsync
+        self.sink = None
+        self.__pending = []
+        self.__lock = threading.Lock()
+        self.__last_fsync = 0.0
+
+    @property
+    def path(self):
+        return segment_path(self.base, self.segment)
+
+    def open(self, path=None, fsync=None, sink=None, start_segment=0):
+        '''
+        Switches the journal on, so that every recorded mutation is appended to the log.
+        The log is split into numbered segments (path.000001, path.000002, ...) and writing
+        always resumes in a fresh segment, so a torn record left by a crash stays at the
+        end of its own segment.
+
+        With a sink, committed records are handed to sink.apply() instead of being logged.
+
+        Arguments:
+            path        str     - Base path of the log segments (defaults to config.journal_path)
+            fsync       str     - "always", "everysec" or "never" (defaults to config.journal_fsync)
+            sink        object  - Optional storage with an apply(records) method, e.g. SqliteStore
+            start_segment int   - Segment the latest snapshot replays from, which writing must
+                                  not resume below even when earlier segments were all deleted
+
+        Exceptions:
+            ValueError  - Occurs when the fsync policy is not recognised
+
+        Return Value:
+            N/A
+        '''
+        fsync = fsync or config.journal_fsync
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"fsync policy must be one of {FSYNC_POLICIES}")
+        self.base = path or config.journal_path
+        self.fsync = fsync
+        self.sink = sink
+        existing = self.segments()
+        self.segment = max(existing[-1] + 1 if existing else 1, start_segment)
+        self.records = 0
+        self.__pending = []
+        self.enabled = True
+
+    def close(self):
+        '''
+        Commits anything still pending and switches the journal off
+        '''
+        self.commit()
+        self.enabled = False
+
+    def record(self, op, **fields):
+        '''
+        Marks the data store (and the shards of it the mutation touched) as changed and,
+        when the journal is on, queues one compact record
+        describing the mutation. Records are serialised immediately so later in-place edits
+        cannot leak into them.
+
+        Arguments:
+            op          str     - Name of the mutation, e.g. "message_send"
+            fields      kwargs  - JSON serialisable payload needed to redo the mutation
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            N/A
+        '''
+        data_store.touch(*shards_touched(op, fields))
+        if not self.enabled:
+            return
+        line = json.dumps({"op": op, **fields}, separators=(",", ":"), default=to_json)
+        with self.__lock:
+            self.__pending.append(line)
+
+    def __write_pending(self):
+        if not self.enabled or not self.__pending:
+            return 0
+        batch = self.__pending
+        self.__pending = []
+        self.records += len(batch)
+        if self.sink is not None:
+            self.sink.apply([json.loads(line) for line in batch])
+            return len(batch)
+        with open(self.path, "a", encoding="utf-8") as log:
+            log.write("\n".join(batch) + "\n")
+            log.flush()
+            now = time.monotonic()
+            if self.fsync == "always" or (self.fsync == "everysec" and now - self.__last_fsync >= 1):
+                os.fsync(log.fileno())
+                self.__last_fsync = now
+        return len(batch)
+
+    def commit(self):
+        '''
+        Group commit: writes every record queued since the last commit (from any request thread)
+        in a single append, then fsyncs according to the configured policy
+
+        Arguments:
+            N/A
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            Returns the number of records written
+        '''
+        with self.__lock:
+            return self.__write_pending()
+
+    def rotate(self):
+        '''
+        Commits anything pending to the current segment and moves writing onto the next one.
+        The caller must hold data_store.lock so no mutation lands between the two.
+
+        Arguments:
+            N/A
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            Returns the number of the new segment
+        '''
+        with self.__lock:
+            self.__write_pending()
+            self.segment += 1
+            self.records = 0
+            return self.segment
+
+    def segments(self, path=None):
+        '''
+        Lists the segment numbers present on disk for a journal, in ascending order
+        '''
+        path = path or self.base
+        directory, name = os.path.split(os.path.abspath(path))
+        pattern = re.compile(re.escape(name) + r"\.(\d{6})$")
+        found = [pattern.match(entry) for entry in os.listdir(directory)]
+        return sorted(int(match.group(1)) for match in found if match)
+
+    def truncate(self, segment, path=None):
+        '''
+        Deletes every segment numbered below the given one, once a snapshot covers them
+        '''
+        path = path or self.base
+        for old in self.segments(path):
+            if old < segment:
+                os.remove(segment_path(path, old))
+
+    def read(self, path=None, start=0):
+        '''
+        Yields every complete record in the segments numbered start and above, oldest first.
+        A torn final line in a segment (e.g. from a crash mid-write) is ignored.
+
+        Arguments:
+            path        str     - Base path of the log segments (defaults to the open journal's)
+            start       int     - First segment to read
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            Yields record dicts
+        '''
+        path = path or self.base
+        for segment in self.segments(path):
+            if segment < start:
+                continue
+            with open(segment_path(path, segment), "r", encoding="utf-8") as log:
+                for line in log:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    yield record
+
+global journal
+journal = Journal()
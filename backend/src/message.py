@@ -1,17 +1,18 @@
 from src.data_store import data_store
 from src.error import InputError, AccessError
 from src.channel import get_channel, user_in_channel, check_valid_id
+from src.journal import journal
+from src.records import Message
 from datetime import timezone
 import datetime
 
-def change_message(user, message_id, chats, is_edit, message):
+def change_message(user, message_id, is_edit, message):
     '''
     Edits or removes message with message_id, from either DM or channel
 
     Arguments:
         user            dict    - User who is making request
         message_id      int     - Message ID of message requested
-        chats           str     - Either "dms" or "channels"
         is_edit         bool    - Indicates whether message is to be edited or removed
         message         str     - Content of message (if is_edit is true)
     
@@ -25,25 +26,28 @@ def change_message(user, message_id, chats, is_edit, message):
         NA
     '''
     store = data_store.get()
-    for chat in store[chats]:
-        if user in chat["all_members"]:
-            for msg in chat['messages']:
-                if msg['message_id'] == message_id:
-                    if msg['user_id'] != user['user_id'] and user not in chat['owner_members'] and chats == 'dms':
-                        raise AccessError(description='User is not sender nor has owner permissions in dm')
-                    if msg['user_id'] != user['user_id'] and not (user in chat['owner_members'] or user['is_owner']):
-                        raise AccessError(description='User is not sender nor has owner permissions in channel')
-                    if is_edit and len(message) > 1000:
-                        raise InputError(description="Length of message is over 1000 characters")
-                    if is_edit:
-                        msg['message'] = message
-                        data_store.set(store)
-                        return
-                    chat['messages'].remove(msg)
-                    data_store.set(store)
-                    return
-    
-    raise InputError(description="Invalid message within channel/DM that user has joined")
+    location = data_store.locate_message(message_id)
+    if location:
+        chats, chat, messages, index = location
+    if not location or user['user_id'] not in chat["all_members"]:
+        raise InputError(description="Invalid message within channel/DM that user has joined")
+
+    msg = messages[index]
+    if msg['user_id'] != user['user_id'] and user['user_id'] not in chat['owner_members'] and chats == 'dms':
+        raise AccessError(description='User is not sender nor has owner permissions in dm')
+    if msg['user_id'] != user['user_id'] and not (user['user_id'] in chat['owner_members'] or user['is_owner']):
+        raise AccessError(description='User is not sender nor has owner permissions in channel')
+    if is_edit and len(message) > 1000:
+        raise InputError(description="Length of message is over 1000 characters")
+    chat_id = chat['channel_id'] if chats == 'channels' else chat['dm_id']
+    if is_edit:
+        data_store.edit_message(message_id, message)
+        journal.record("message_edit", chats=chats, chat_id=chat_id, message_id=message_id, message=message)
+        data_store.set(store)
+        return
+    data_store.remove_message(message_id)
+    journal.record("message_remove", chats=chats, chat_id=chat_id, message_id=message_id)
+    data_store.set(store)
 
 def message_send(auth_user_id, channel_id, message):
     '''
@@ -76,15 +80,14 @@ def message_send(auth_user_id, channel_id, message):
 
     new_id = store['message_count']
     store['message_count'] += 1
-    channel["messages"].insert(
-        0,
-        {
-            'message_id': new_id,
-            'user_id': auth_user_id,
-            'message': message,
-            'time_sent': int(datetime.datetime.now(timezone.utc).replace(tzinfo=timezone.utc).timestamp()),
-        }
+    sent = Message(
+        message_id=new_id,
+        user_id=auth_user_id,
+        message=message,
+        time_sent=int(datetime.datetime.now(timezone.utc).replace(tzinfo=timezone.utc).timestamp()),
     )
+    data_store.add_message("channels", channel, sent)
+    journal.record("message_send", chats="channels", chat_id=channel_id, message=sent)
     data_store.set(store)
     return { 'message_id': new_id }
 
@@ -110,15 +113,9 @@ def message_edit(auth_user_id, message_id, message):
     store = data_store.get()
     user = check_valid_id(auth_user_id, store)
     if not len(message):
-        try:
-            change_message(user, message_id, 'channels', False, None)
-        except Exception:
-            change_message(user, message_id, 'dms', False, None)
+        change_message(user, message_id, False, None)
     else:
-        try:
-            change_message(user, message_id, 'channels', True, message)
-        except Exception:
-            change_message(user, message_id, 'dms', True, message)
+        change_message(user, message_id, True, message)
     return {}
 
 def message_remove(auth_user_id, message_id):
@@ -141,9 +138,6 @@ def message_remove(auth_user_id, message_id):
     store = data_store.get()
     user = check_valid_id(auth_user_id, store)
 
-    try:
-        change_message(user, message_id, 'channels', False, None)
-    except Exception:
-        change_message(user, message_id, 'dms', False, None)
+    change_message(user, message_id, False, None)
 
     return {}
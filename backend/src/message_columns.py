@@ -0,0 +1,89 @@
+'''
+message_columns.py
+
+A column oriented container for a chat's messages. Instead of one Message record per message
+it keeps message ids, sender ids and send times in array('q') columns, 8 bytes a value, and the
+texts in a parallel list, so a message costs a few machine words on top of its text.
+
+MessageColumns stands in for the list of Message records a chat normally holds: it can be
+indexed, sliced, iterated, appended to and deleted from, oldest first like the list. Messages
+read out of it are new Message records built from the columns, so changing one doesn't change
+the chat; to change a message, assign it back (messages[index] = message).
+'''
+from array import array
+from src.records import Message
+
+class MessageColumns:
+    __slots__ = ("message_ids", "user_ids", "times_sent", "texts")
+
+    def __init__(self, messages=(), columns=None):
+        if columns is not None:
+            self.message_ids, self.user_ids, self.times_sent, self.texts = columns
+            return
+        self.message_ids = array('q')
+        self.user_ids = array('q')
+        self.times_sent = array('q')
+        self.texts = []
+        self.extend(messages)
+
+    def __len__(self):
+        return len(self.message_ids)
+
+    def message(self, index):
+        return Message(self.message_ids[index], self.user_ids[index], self.texts[index], self.times_sent[index])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.message(position) for position in range(*index.indices(len(self)))]
+        return self.message(index)
+
+    def __iter__(self):
+        return map(Message, self.message_ids, self.user_ids, self.texts, self.times_sent)
+
+    def __setitem__(self, index, message):
+        if isinstance(index, slice):
+            replacement = MessageColumns(message)
+            self.message_ids[index] = replacement.message_ids
+            self.user_ids[index] = replacement.user_ids
+            self.times_sent[index] = replacement.times_sent
+            self.texts[index] = replacement.texts
+            return
+        self.message_ids[index] = message["message_id"]
+        self.user_ids[index] = message["user_id"]
+        self.times_sent[index] = message["time_sent"]
+        self.texts[index] = message["message"]
+
+    def __delitem__(self, index):
+        del self.message_ids[index]
+        del self.user_ids[index]
+        del self.times_sent[index]
+        del self.texts[index]
+
+    def append(self, message):
+        self.message_ids.append(message["message_id"])
+        self.user_ids.append(message["user_id"])
+        self.times_sent.append(message["time_sent"])
+        self.texts.append(message["message"])
+
+    def extend(self, messages):
+        for message in messages:
+            self.append(message)
+
+    def reverse(self):
+        self.message_ids.reverse()
+        self.user_ids.reverse()
+        self.times_sent.reverse()
+        self.texts.reverse()
+
+    def __eq__(self, other):
+        if isinstance(other, (MessageColumns, list)):
+            return len(self) == len(other) and all(mine == theirs for mine, theirs in zip(self, other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return (MessageColumns, ((), (self.message_ids, self.user_ids, self.times_sent, self.texts)))
+
+    def __repr__(self):
+        return f"MessageColumns({list(self)!r})"
@@ -1,10 +1,12 @@
 from src.data_store import data_store
+from src.journal import journal
 
 def clear_v1():
     store = data_store.get()
     store['users'] = []
-    store['channels'] = []
-    store['dms'] = []
+    store['channels'] = {}
+    store['dms'] = {}
     store['dm_count'] = 0
     store['message_count'] = 0
+    journal.record("clear")
     data_store.set(store)
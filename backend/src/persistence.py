@@ -1,7 +1,466 @@
+import os
 import pickle
-from src.data_store import data_store
+import threading
+import time
+from src import config
+from src.data_store import data_store, upgrade_store
+from src.journal import journal
+from src.records import User, Message, CHAT_RECORDS, unpickle
+from src.channel import get_channel
+from src.dm import get_dm
+from src.admin import remove_user
+from src.sqlite_store import SqliteStore
+from src.shards import ShardStore
+from src.cold_messages import ColdStore
+from src import binary_format
+
+saved_generation = data_store.generation
+write_lock = threading.Lock()
+persister = None
+snapshot_thread = None
+snapshot_stats = {"in_progress": False, "seconds": None, "bytes": None, "last_success": None, "last_status": None}
+sqlite_store = None
+shard_store = None
+
+def write_persistence():
+    '''
+    Writes any changes made since the last write. Does nothing at all when the data store's
+    generation hasn't moved. The store is only locked while it is pickled into memory,
+    the disk write itself happens with requests free to run. With snapshot_fork set, pickle
+    and binary mode instead fork a snapshot and return straight away.
+
+    Arguments:
+        N/A
+
+    Exceptions:
+        N/A
+
+    Return Value:
+        Returns True if anything was written (or a snapshot started), False otherwise
+    '''
+    global saved_generation
+    with write_lock:
+        with data_store.lock:
+            generation = data_store.generation
+            if generation == saved_generation:
+                return False
+            if config.persistence in ("pickle", "binary") and forking():
+                # changes made while a snapshot is in flight are picked up by a later write
+                if not snapshot_persistence():
+                    return False
+                saved_generation = generation
+                return True
+            if config.persistence in ("pickle", "binary"):
+                data = encode_store(data_store.get())
+            elif config.persistence == "sharded":
+                blobs = shard_store.dump(data_store.get(), data_store.take_dirty())
+
+        if config.persistence in ("pickle", "binary"):
+            write_datastore(data)
+        elif config.persistence == "sharded":
+            shard_store.write(blobs)
+        else:
+            journal.commit()
+            if config.persistence == "journal" and journal.records >= config.snapshot_every:
+                snapshot_persistence()
+        saved_generation = generation
+        return True
+
+def encode_store(store, journal_segment=None):
+    '''
+    Serialises the store for datastore_path, as a snapshot envelope in journal mode
+    '''
+    if journal_segment is not None:
+        return pickle.dumps({"store": store, "journal_segment": journal_segment})
+    if config.persistence == "binary":
+        return binary_format.dumps(store)
+    return pickle.dumps(store)
+
+def write_datastore(data, sync=False):
+    with open(config.datastore_path + ".tmp", 'wb') as FILE:
+        FILE.write(data)
+        if sync:
+            FILE.flush()
+            os.fsync(FILE.fileno())
+    os.replace(config.datastore_path + ".tmp", config.datastore_path)
 
 def save_persistence():
+    '''
+    Called at the end of every mutating request. Writes straight away, or with a background
+    persister running, leaves the write to it and only wakes it early once enough changes
+    have built up. Read-only requests never cause a write either way.
+
+    Arguments:
+        N/A
+
+    Exceptions:
+        N/A
+
+    Return Value:
+        Returns True if anything was written by this call, False otherwise
+    '''
+    if persister is None:
+        return write_persistence()
+    if data_store.generation - saved_generation >= config.persist_batch:
+        persister.wake()
+    return False
+
+class Persister(threading.Thread):
+    '''
+    Group commits every change made within a flush interval into a single write
+    '''
+    def __init__(self, interval):
+        super().__init__(name="persister", daemon=True)
+        self.interval = interval
+        self.__stopping = False
+        self.__wakeup = threading.Condition()
+
+    def wake(self):
+        with self.__wakeup:
+            self.__wakeup.notify()
+
+    def run(self):
+        while not self.__stopping:
+            with self.__wakeup:
+                self.__wakeup.wait(self.interval)
+            write_persistence()
+
+    def stop(self):
+        self.__stopping = True
+        self.wake()
+        self.join()
+
+def start_persistence(interval=None):
+    '''
+    Starts the background persister, after which save_persistence() no longer blocks on disk
+
+    Arguments:
+        interval    float   - Seconds between flushes (defaults to config.persist_interval)
+
+    Exceptions:
+        N/A
+
+    Return Value:
+        N/A
+    '''
+    global persister
+    if persister is None:
+        persister = Persister(interval or config.persist_interval)
+        persister.start()
+
+def forking():
+    if config.snapshot_fork is None:
+        return config.persistence == "journal" and hasattr(os, "fork")
+    return config.snapshot_fork and hasattr(os, "fork")
+
+def snapshot_persistence():
+    '''
+    Writes a snapshot of the whole store to datastore_path in the background. In journal mode
+    this is the journal compaction: the journal moves onto a fresh segment, the snapshot covers
+    every earlier segment and those segments are deleted once it is written, so startup only
+    has to replay what was journalled after the latest snapshot.
+
+    Where it can (see config.snapshot_fork) the process forks, as Redis' BGSAVE does, and the
+    child serialises and writes its copy-on-write view of the store while the parent carries on
+    serving requests. Otherwise the store is pickled on the calling thread under the store lock,
+    so requests wait for the serialisation of the whole store, and only the write is left to a
+    thread.
+
+    Arguments:
+        N/A
+
+    Exceptions:
+        N/A
+
+    Return Value:
+        Returns True if a snapshot was started, False if one is already in flight
+    '''
+    global snapshot_thread
+    if snapshot_thread is not None and snapshot_thread.is_alive():
+        return False
+    with data_store.lock:
+        segment = journal.rotate() if config.persistence == "journal" else None
+        started = time.time()
+        if forking():
+            pid = os.fork()
+            if pid == 0:
+                write_snapshot_child(segment)
+            target, args = wait_snapshot_child, (pid, started, segment)
+        else:
+            target, args = write_snapshot, (encode_store(data_store.get(), segment), started, segment)
+        snapshot_stats["in_progress"] = True
+    snapshot_thread = threading.Thread(target=target, args=args, name="snapshot", daemon=True)
+    snapshot_thread.start()
+    return True
+
+def write_snapshot(data, started, segment):
+    try:
+        write_datastore(data, sync=True)
+    except OSError:
+        snapshot_finished(started, segment, False)
+        raise
+    snapshot_finished(started, segment, True)
+
+def write_snapshot_child(segment):
+    '''
+    Runs in the forked child: writes the snapshot and exits without returning to the server
+    '''
+    status = 1
+    try:
+        write_datastore(encode_store(data_store.get(), segment), sync=True)
+        status = 0
+    finally:
+        os._exit(status)
+
+def wait_snapshot_child(pid, started, segment):
+    _, status = os.waitpid(pid, 0)
+    snapshot_finished(started, segment, os.waitstatus_to_exitcode(status) == 0)
+
+def snapshot_finished(started, segment, success):
+    global saved_generation
+    snapshot_stats["in_progress"] = False
+    snapshot_stats["seconds"] = time.time() - started
+    snapshot_stats["last_status"] = "ok" if success else "failed"
+    if not success:
+        # make sure the next write tries again; waiting for write_lock means a write_persistence()
+        # that started this snapshot has already recorded its generation
+        with write_lock:
+            saved_generation = -1
+        return
+    snapshot_stats["bytes"] = os.path.getsize(config.datastore_path)
+    snapshot_stats["last_success"] = time.time()
+    if segment is not None:
+        journal.truncate(segment, config.journal_path)
+
+def get_snapshot_stats():
+    '''
+    Reports on background snapshots
+
+    Arguments:
+        N/A
+
+    Exceptions:
+        N/A
+
+    Return Value:
+        Returns { in_progress, seconds, bytes, last_success, last_status } describing the latest
+        snapshot, where last_success is the unix time the last successful one finished
+    '''
+    return dict(snapshot_stats)
+
+def wait_for_snapshot():
+    if snapshot_thread is not None:
+        snapshot_thread.join()
+
+def stop_persistence():
+    '''
+    Stops the background persister (if any) and flushes everything still outstanding to disk.
+    Must be called before the server exits, otherwise the last interval of changes is lost.
+
+    Arguments:
+        N/A
+
+    Exceptions:
+        N/A
+
+    Return Value:
+        N/A
+    '''
+    global persister
+    if persister is not None:
+        persister.stop()
+        persister = None
+    wait_for_snapshot()
+    write_persistence()
+    wait_for_snapshot()
+
+def load_persistence():
+    '''
+    Restores the data store on startup from datastore_path and, in journal mode, replays
+    the journal segments written after that snapshot was taken. In sqlite and sharded mode
+    the store is read from sqlite_path or shard_path instead, importing datastore_path the
+    first time round. Also sets up the cold store when config.hot_messages is set, and frees
+    the space in it taken up by replaced pages.
+
+    Arguments:
+        N/A
+
+    Exceptions:
+        N/A
+
+    Return Value:
+        Returns { records, seconds } describing the journal replay
+    '''
+    if data_store.cold is not None:
+        data_store.cold.close()
+    data_store.tier_messages(None if config.hot_messages is None else ColdStore(config.cold_path, config.cold_page_size),
+        config.hot_messages)
+    data_store.columnar_messages(config.columnar_messages)
+    data_store.compact_deleted(config.compact_deleted)
+    data_store.pool_messages(config.message_pool_size)
+    # cold store segments the snapshot on disk refers to, which journal replay may stop using
+    snapshot_segments = set()
+    if config.persistence == "sqlite":
+        loaded = load_sqlite()
+    elif config.persistence == "sharded":
+        loaded = load_sharded()
+    else:
+        loaded = load_snapshot(snapshot_segments)
+    if data_store.cold is not None:
+        data_store.reclaim_cold(snapshot_segments)
+    return loaded
+
+def load_snapshot(snapshot_segments):
+    global saved_generation
+    start_segment = 0
+    if os.path.exists(config.datastore_path):
+        data = read_datastore()
+        if "journal_segment" in data:
+            start_segment = data["journal_segment"]
+            data = data["store"]
+        data_store.set(data)
+        snapshot_segments.update(
+            page["segment"] for chats in ("channels", "dms") for chat in data_store.get()[chats].values()
+            for page in chat.get("cold_pages", ())
+        )
+
+    if config.persistence != "journal":
+        saved_generation = data_store.generation
+        return {"records": 0, "seconds": 0}
+
+    started = time.perf_counter()
     store = data_store.get()
-    with open('datastore.p', 'wb') as FILE:
-        pickle.dump(store, FILE)
\ No newline at end of file
+    replayed = 0
+    for record in journal.read(config.journal_path, start_segment):
+        apply_record(store, record)
+        replayed += 1
+    data_store.set(store)
+    saved_generation = data_store.generation
+    journal.open(config.journal_path, config.journal_fsync, start_segment=start_segment)
+    # the replayed records are still in the journal, so they count towards the next snapshot
+    journal.records = replayed
+    seconds = time.perf_counter() - started
+    print(f"Replayed {replayed} journal records in {seconds * 1000:.1f} ms")
+    if replayed >= config.snapshot_every:
+        snapshot_persistence()
+    return {"records": replayed, "seconds": seconds}
+
+def read_datastore():
+    '''
+    Reads datastore_path, which may hold a pickle or the binary format whichever
+    mode wrote it, so switching between the two keeps the existing data
+    '''
+    with open(config.datastore_path, "rb") as FILE:
+        data = FILE.read()
+    if binary_format.is_binary(data):
+        return binary_format.loads(data)
+    return unpickle(data)
+
+def load_sqlite():
+    global saved_generation, sqlite_store
+    sqlite_store = SqliteStore(config.sqlite_path)
+    if sqlite_store.is_empty() and os.path.exists(config.datastore_path):
+        data = read_datastore()
+        data = data.get("store", data)
+        # datastore.p may still be in an older layout, e.g. with chats held in lists
+        upgrade_store(data)
+        sqlite_store.import_store(data)
+    store = sqlite_store.load(lazy=config.lazy_messages)
+    data_store.set(store)
+    if config.lazy_messages:
+        defer_messages(store, sqlite_store.load_chat_messages, sqlite_store)
+    saved_generation = data_store.generation
+    journal.open(config.journal_path, config.journal_fsync, sink=sqlite_store)
+    return {"records": 0, "seconds": 0}
+
+def load_sharded():
+    global saved_generation, shard_store
+    shard_store = ShardStore(config.shard_path)
+    store = shard_store.load(lazy=config.lazy_messages)
+    if store is not None:
+        data_store.set(store)
+        data_store.take_dirty()
+        if config.lazy_messages:
+            defer_messages(store, shard_store.load_messages, shard_store)
+        saved_generation = data_store.generation
+    elif os.path.exists(config.datastore_path):
+        data = read_datastore()
+        data_store.set(data.get("store", data))
+        write_persistence()
+    return {"records": 0, "seconds": 0}
+
+def defer_messages(store, loader, locator):
+    chats = len(store["channels"]) + len(store["dms"])
+    data_store.defer_messages(loader, chats, locator)
+    print(f"Deferred loading messages of {chats} chats")
+
+def get_chat(store, chats, chat_id):
+    if chats == "channels":
+        return get_channel(chat_id, store)
+    return get_dm(chat_id, store)
+
+def apply_record(store, record):
+    '''
+    Redoes a single journal record against the store
+
+    Arguments:
+        store       dict    - Database of Seams information
+        record      dict    - Record produced by journal.record
+
+    Exceptions:
+        ValueError  - Occurs when the record's op is not recognised
+
+    Return Value:
+        N/A
+    '''
+    op = record["op"]
+    users = store["users"]
+
+    if op == "user":
+        user = record["user"]
+        if user["user_id"] < len(users):
+            data_store.update_user(users[user["user_id"]], user)
+        else:
+            data_store.add_user(User(**user))
+    elif op == "chat_create":
+        chat = CHAT_RECORDS[record["chats"]](**record["chat"])
+        chat["owner_members"] = dict.fromkeys(chat["owner_members"])
+        chat["all_members"] = dict.fromkeys(chat["all_members"])
+        chat["messages"] = []
+        data_store.add_chat(record["chats"], chat)
+        if record["chats"] == "dms":
+            store["dm_count"] = max(store["dm_count"], chat["dm_id"] + 1)
+    elif op == "chat_remove":
+        data_store.remove_chat(record["chats"], record["chat_id"])
+    elif op == "chat_join":
+        data_store.join_chat(record["chats"], get_chat(store, record["chats"], record["chat_id"]), record["u_id"])
+    elif op == "chat_leave":
+        chat = get_chat(store, record["chats"], record["chat_id"])
+        # leaving a channel gives up ownership, a dm remembers its creator
+        if record["chats"] == "channels":
+            data_store.remove_owner("channels", chat, record["u_id"])
+        data_store.leave_chat(record["chats"], chat, record["u_id"])
+    elif op == "owner_add":
+        data_store.add_owner(record["chats"], get_chat(store, record["chats"], record["chat_id"]), record["u_id"])
+    elif op == "owner_remove":
+        data_store.remove_owner(record["chats"], get_chat(store, record["chats"], record["chat_id"]), record["u_id"])
+    elif op == "message_send":
+        message = Message(**record["message"])
+        chat = get_chat(store, record["chats"], record["chat_id"])
+        data_store.add_message(record["chats"], chat, message)
+        store["message_count"] = max(store["message_count"], message["message_id"] + 1)
+    elif op == "message_edit":
+        data_store.edit_message(record["message_id"], record["message"])
+    elif op == "message_remove":
+        data_store.remove_message(record["message_id"])
+    elif op == "user_remove":
+        remove_user(users[record["user_id"]], store)
+    elif op == "clear":
+        store["users"].clear()
+        store["channels"].clear()
+        store["dms"].clear()
+        store["dm_count"] = 0
+        store["message_count"] = 0
+        data_store.reindex()
+    else:
+        raise ValueError(f"Unknown journal record {op}")
@@ -0,0 +1,210 @@
+'''
+records.py
+
+Compact record types for what the data store holds. Each is a class with __slots__ instead of
+a dict, so a record keeps its values in a fixed array with no per record hash table of keys.
+Records still read and write like the dicts they replace (record["message"], "messages" in
+chat, chat.get("cold_pages"), ...), so code handling them needn't care which it has. A field
+that hasn't been set is missing, just like an absent key.
+'''
+import gc
+import pickle
+from array import array
+
+class Record:
+    __slots__ = ()
+
+    def __init__(self, **fields):
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    @classmethod
+    def from_dict(cls, fields):
+        '''
+        Returns fields as this record type, converting it if it's a plain dict
+        '''
+        return fields if isinstance(fields, cls) else cls(**fields)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        setattr(self, key, value)
+
+    def __delitem__(self, key):
+        try:
+            delattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return key in self.__slots__ and hasattr(self, key)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        return [key for key in self.__slots__ if hasattr(self, key)]
+
+    def values(self):
+        return [getattr(self, key) for key in self.keys()]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def get(self, key, default=None):
+        return getattr(self, key, default) if key in self.__slots__ else default
+
+    def pop(self, key, *default):
+        if key in self:
+            value = getattr(self, key)
+            delattr(self, key)
+            return value
+        if default:
+            return default[0]
+        raise KeyError(key)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            setattr(self, key, default)
+        return getattr(self, key)
+
+    def update(self, changes):
+        for key, value in changes.items():
+            setattr(self, key, value)
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def __eq__(self, other):
+        if isinstance(other, (Record, dict)):
+            return self.to_dict() == dict(other.items())
+        return NotImplemented
+
+    __hash__ = None
+
+    def __reduce__(self):
+        # much quicker to pickle and unpickle than the default handling of __slots__
+        return (restore, (type(self), self.to_dict()))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+class User(Record):
+    __slots__ = ("user_id", "user_handle", "is_owner", "email", "password", "name_first", "name_last",
+        "sessions", "total_sessions", "is_active")
+
+    def profile(self):
+        '''
+        Returns the user as the { u_id, email, name_first, name_last, handle_str } API shape
+        '''
+        return {
+            'u_id': self.user_id,
+            'email': self.email,
+            'name_first': self.name_first,
+            'name_last': self.name_last,
+            'handle_str': self.user_handle,
+        }
+
+class Chat(Record):
+    __slots__ = ()
+
+    def __reduce__(self):
+        # a list of messages goes as a few columns, rather than one reduce per message
+        fields = self.to_dict()
+        if type(fields.get("messages")) is not list:
+            return (restore, (type(self), fields))
+        return (restore_chat, (type(self), fields, pack_messages(fields.pop("messages"))))
+
+class Channel(Chat):
+    # messages and cold_pages are left unset while a chat's messages haven't been loaded or
+    # haven't been moved to the cold store
+    __slots__ = ("channel_id", "name", "is_public", "owner_members", "all_members", "messages", "cold_pages")
+
+class Dm(Chat):
+    __slots__ = ("dm_id", "name", "owner_members", "all_members", "messages", "cold_pages")
+
+class Message(Record):
+    __slots__ = ("message_id", "user_id", "message", "time_sent")
+
+    # the common case, with a fixed signature so creating millions of them stays cheap
+    def __init__(self, message_id, user_id, message, time_sent):
+        self.message_id = message_id
+        self.user_id = user_id
+        self.message = message
+        self.time_sent = time_sent
+
+    def __reduce__(self):
+        return (Message, (self.message_id, self.user_id, self.message, self.time_sent))
+
+    def output(self):
+        '''
+        Returns the message as the { message_id, u_id, message, time_sent } API shape
+        '''
+        return {
+            "message_id": self.message_id,
+            "u_id": self.user_id,
+            "message": self.message,
+            "time_sent": self.time_sent,
+        }
+
+CHAT_RECORDS = {'channels': Channel, 'dms': Dm}
+
+def restore(cls, fields):
+    '''
+    Rebuilds a pickled record
+    '''
+    return cls(**fields)
+
+def restore_chat(cls, fields, packed):
+    '''
+    Rebuilds a pickled chat along with its packed messages
+    '''
+    chat = cls(**fields)
+    chat.messages = unpack_messages(packed)
+    return chat
+
+def pack_messages(messages):
+    '''
+    Returns a list of messages as (message_ids, user_ids, texts, times_sent) columns, which pickle
+    far quicker than the records themselves
+    '''
+    return (
+        array('q', [message.message_id for message in messages]),
+        array('q', [message.user_id for message in messages]),
+        [message.message for message in messages],
+        array('q', [message.time_sent for message in messages]),
+    )
+
+def unpack_messages(packed):
+    '''
+    Rebuilds the list of messages pack_messages() was given
+    '''
+    return list(map(Message, *packed))
+
+def unpickle(data):
+    '''
+    pickle.loads() with the cyclic garbage collector paused, as every record unpickled counts
+    towards its next collection and a large store would otherwise set off dozens of them
+    '''
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return pickle.loads(data)
+    finally:
+        if enabled:
+            gc.enable()
+
+def to_json(value):
+    '''
+    json.dumps() default hook that writes records as the dicts they stand in for
+    '''
+    if isinstance(value, Record):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
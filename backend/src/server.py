@@ -1,5 +1,6 @@
 import sys
 import signal
+import logging
 from json import dumps
 from flask import Flask, request
 from flask_cors import CORS
@@ -10,7 +11,7 @@ from src.other import clear_v1
 from src.auth import auth_login_v1, auth_register_v1
 from src.channels import channels_create_v1
 from src.channel import channel_messages_v1, channel_invite_v1
-from src.token import decode, check_valid_token
+from src.token import decode, check_valid_token, forget_session
 from src.admin import admin_userpermission_change_implement, admin_user_remove_implement
 from src.user import user_profile_sethandle_implement, user_profile_setname_implement, user_profile_setemail_implement
 from src.channel import channel_details_v1, channel_join_v1
@@ -19,12 +20,15 @@ from src.channels import channels_list_v1, channels_listall_v1
 from src.dm import dm_create, dm_list, dm_details, dm_remove, dm_messages, dm_leave, message_senddm
 from src.message import message_send, message_remove, message_edit
 from src.user import user_profile_implement, users_all_implement
-from src.persistence import save_persistence
+from src.persistence import save_persistence, load_persistence, start_persistence, stop_persistence
+from src.compactor import start_compactor, stop_compactor
 from src.data_store import data_store
-import pickle
+from src.journal import journal
 
 def quit_gracefully(*args):
     '''For coverage'''
+    stop_compactor()
+    stop_persistence()
     exit(0)
 
 def defaultHandler(err):
@@ -40,6 +44,8 @@ def defaultHandler(err):
 
 APP = Flask(__name__)
 CORS(APP)
+# Flask's logger only emits warnings by default, which would hide the admin removal summaries
+APP.logger.setLevel(logging.INFO)
 
 APP.config['TRAP_HTTP_EXCEPTIONS'] = True
 APP.register_error_handler(Exception, defaultHandler)
@@ -47,12 +53,24 @@ APP.register_error_handler(Exception, defaultHandler)
 #### NO NEED TO MODIFY ABOVE THIS POINT, EXCEPT IMPORTS
 
 try:
-    data = pickle.load(open("datastore.p", "rb"))
-    store = data_store.get()
-    store = data
-    data_store.set(store)
-except Exception:
-    pass
+    load_persistence()
+except Exception as load_error:
+    # carrying on with an empty store and the journal closed would lose every later write,
+    # and in pickle mode overwrite the saved store on the next one
+    print(f"Could not load the datastore: {load_error!r}", file=sys.stderr)
+    sys.exit(1)
+if config.persist_in_background:
+    start_persistence()
+if config.compact_in_background:
+    start_compactor()
+
+@APP.before_request
+def lock_data_store():
+    data_store.lock.acquire()
+
+@APP.teardown_request
+def unlock_data_store(exc):
+    data_store.lock.release()
 
 # Example
 @APP.route("/echo", methods=['GET'])
@@ -100,7 +118,6 @@ def channels_list_v2():
         raise AccessError(description='Invalid token')
     user_id = user_data['user_id']
     channels_list = channels_list_v1(user_id)
-    save_persistence()
     return dumps(channels_list)
    
 @APP.route("/channels/listall/v2", methods=['GET'])
@@ -110,7 +127,6 @@ def channels_listall_v2():
         raise AccessError(description='Invalid token')
     user_id = user_data['user_id']
     channels_list = channels_listall_v1(user_id)
-    save_persistence()
     return dumps(channels_list)
 
 @APP.route("/channel/details/v2", methods=['GET'])
@@ -122,7 +138,6 @@ def channel_details_v2():
     channel_id = int(request.args.get('channel_id'))
     user_id = user_data['user_id']
     details = channel_details_v1(user_id, channel_id)
-    save_persistence()
     return dumps(details)
     
 
@@ -147,8 +162,9 @@ def channel_invite_v2():
     user_data = decode(invite_data['token'])
     if user_data is None or not check_valid_token(user_data):
         raise AccessError(description='Invalid token')
+    result = channel_invite_v1(user_data["user_id"], invite_data["channel_id"], invite_data["u_id"])
     save_persistence()
-    return dumps(channel_invite_v1(user_data["user_id"], invite_data["channel_id"], invite_data["u_id"]))
+    return dumps(result)
 
 @APP.route("/channel/messages/v2", methods=['GET'])
 def channel_messages_v2():
@@ -158,7 +174,6 @@ def channel_messages_v2():
     channel_id = int(request.args.get('channel_id'))
     start = int(request.args.get('start'))
     messages = channel_messages_v1(user_data["user_id"], channel_id, start)
-    save_persistence()
     return dumps(messages)
 
 @APP.route("/clear/v1", methods=['DELETE'])
@@ -175,6 +190,8 @@ def auth_logout_v1():
     user = check_valid_token(token)
     if user:
         user["sessions"].remove(token["session"])
+        forget_session(user["user_id"], token["session"])
+        journal.record("user", user=user)
     else:
         raise AccessError(description='Invalid token')
     save_persistence()
@@ -186,8 +203,9 @@ def channel_leave_v1():
     user_data = decode(channel_data['token'])
     if user_data is None or not check_valid_token(user_data):
         raise AccessError(description='Invalid token')
+    result = channel_leave(user_data["user_id"], channel_data["channel_id"])
     save_persistence()
-    return dumps(channel_leave(user_data["user_id"], channel_data["channel_id"]))
+    return dumps(result)
 
 @APP.route("/channel/addowner/v1", methods=['POST'])
 def channel_addowner_v1():
@@ -221,8 +239,9 @@ def message_send_v1():
     user_data = decode(message_data['token'])
     if user_data is None or not check_valid_token(user_data):
         raise AccessError(description='Invalid token')
+    result = message_send(user_data["user_id"], message_data["channel_id"], message_data["message"])
     save_persistence()
-    return dumps(message_send(user_data["user_id"], message_data["channel_id"], message_data["message"]))
+    return dumps(result)
 
 @APP.route("/message/edit/v1", methods=['PUT'])
 def message_edit_v1():
@@ -230,8 +249,9 @@ def message_edit_v1():
     user_data = decode(message_data['token'])
     if user_data is None or not check_valid_token(user_data):
         raise AccessError(description='Invalid token')
+    result = message_edit(user_data["user_id"], message_data["message_id"], message_data["message"])
     save_persistence()
-    return dumps(message_edit(user_data["user_id"], message_data["message_id"], message_data["message"]))
+    return dumps(result)
 
 @APP.route("/message/remove/v1", methods=['DELETE'])
 def message_remove_v1():
@@ -239,8 +259,9 @@ def message_remove_v1():
     user_data = decode(message_data['token'])
     if user_data is None or not check_valid_token(user_data):
         raise AccessError(description='Invalid token')
+    result = message_remove(user_data["user_id"], message_data["message_id"])
     save_persistence()
-    return dumps(message_remove(user_data["user_id"], message_data["message_id"]))
+    return dumps(result)
 
 @APP.route("/dm/create/v1", methods=['POST'])
 def dm_create_v1():
@@ -249,8 +270,9 @@ def dm_create_v1():
     
     user = check_valid_token(token)
     if user:
+        result = dm_create(user, dm_data["u_ids"])
         save_persistence()
-        return dumps(dm_create(user, dm_data["u_ids"]))
+        return dumps(result)
     else:
         raise AccessError(description='Invalid token')
 
@@ -262,7 +284,6 @@ def dm_list_v1():
         raise AccessError(description='Invalid token')
     
     user_id = user_data['user_id']
-    save_persistence()
     return dumps(dm_list(user_id))
 
         
@@ -275,8 +296,9 @@ def dm_remove_v1():
     
     user = check_valid_token(token)
     if user:
+        result = dm_remove(user, dm_data["dm_id"])
         save_persistence()
-        return dumps(dm_remove(user, dm_data["dm_id"]))
+        return dumps(result)
     else:
         raise AccessError(description='Invalid token')
 
@@ -288,7 +310,6 @@ def dm_details_v1():
 
     user_id = user_data['user_id']
     dm_id = int(request.args.get('dm_id'))
-    save_persistence()
     return dumps(dm_details(user_id, dm_id))
 
 # dm/leave/v1
@@ -298,8 +319,9 @@ def dm_leave_v1():
     user_data = decode(dm_data['token'])
     if user_data is None or not check_valid_token(user_data):
         raise AccessError(description='Invalid token')
+    result = dm_leave(user_data["user_id"], dm_data["dm_id"])
     save_persistence()
-    return dumps(dm_leave(user_data["user_id"], dm_data["dm_id"]))
+    return dumps(result)
 
 # dm/messages/v1
 @APP.route("/dm/messages/v1", methods=['GET'])
@@ -311,7 +333,6 @@ def dm_messages_v1():
     dm_id = int(request.args.get('dm_id'))
     start = int(request.args.get('start'))
     dm_message = dm_messages(user_data['user_id'], dm_id, start)
-    save_persistence()
     return dumps(dm_message)
 
 # message/senddm/v1
@@ -321,8 +342,9 @@ def message_senddm_v1():
     user_data = decode(message_data['token'])
     if user_data is None or not check_valid_token(user_data):
         raise AccessError(description='Invalid token')
+    result = message_senddm(user_data["user_id"], message_data["dm_id"], message_data["message"])
     save_persistence()
-    return dumps(message_senddm(user_data["user_id"], message_data["dm_id"], message_data["message"]))
+    return dumps(result)
 
 @APP.route("/users/all/v1", methods=['GET'])
 def users_all_v1():
@@ -330,7 +352,6 @@ def users_all_v1():
     if user_data is None or not check_valid_token(user_data):
         raise AccessError(description='Invalid token')
     users_all = users_all_implement()
-    save_persistence()
     return dumps(users_all)
 
 @APP.route("/user/profile/v1", methods=['GET'])
@@ -340,7 +361,6 @@ def user_profile_v1():
         raise AccessError(description='Invalid token')
     user_id = int(request.args.get('u_id'))
     user_profile = user_profile_implement(user_id)
-    save_persistence()
     return dumps(user_profile)
     
 
@@ -395,7 +415,8 @@ def admin_user_remove_v1():
     if user and not user["is_owner"]:
         raise AccessError(description='Authorised user is not a global owner')
 
-    admin_user_remove_implement(data["u_id"])
+    removed = admin_user_remove_implement(data["u_id"])
+    APP.logger.info("Removed user %s: rewrote %s messages, left %s chats", data["u_id"], removed["messages"], removed["chats"])
     save_persistence()
     return dumps({})
 
@@ -0,0 +1,198 @@
+import os
+import re
+import pickle
+from src.data_store import ALL_SHARDS, chat_key, senders
+from src.records import CHAT_RECORDS, pack_messages, unpack_messages, unpickle
+
+CHAT_FILE = re.compile(r"^(channel|dm)_(\d+)\.p$")
+MESSAGES_FILE = re.compile(r"^(channel|dm)_(\d+)\.messages\.p$")
+
+def message_summary(messages):
+    '''
+    Returns (first message_id, last message_id, senders) of a chat's messages, oldest first
+    '''
+    if not messages:
+        return (0, -1, [])
+    return (messages[0]["message_id"], messages[-1]["message_id"], sorted(senders(messages)))
+
+def shards_touched(op, fields):
+    '''
+    Given a journal record, returns the shards of the store that the mutation changed
+
+    Arguments:
+        op          str     - Name of the mutation, e.g. "message_send"
+        fields      dict    - The record's payload
+
+    Exceptions:
+        N/A
+
+    Return Value:
+        Returns a tuple of shard keys
+    '''
+    if op == "user":
+        return ("users",)
+    if op == "chat_create":
+        chats = fields["chats"]
+        chat_id = fields["chat"]["channel_id" if chats == "channels" else "dm_id"]
+        return ((chats, chat_id), "counters")
+    if op == "message_send":
+        return ((fields["chats"], fields["chat_id"]), "counters")
+    if "chat_id" in fields:
+        return ((fields["chats"], fields["chat_id"]),)
+    # user_remove rewrites messages in any chat, clear empties everything
+    return (ALL_SHARDS,)
+
+class ShardStore:
+    '''
+    Persists the store as one pickle per channel and per dm, plus one for users and one for
+    the id counters, so a mutation only rewrites the shards it touched. Each chat's messages sit in
+    a file of their own next to it, so they can be loaded separately and are left alone when
+    a chat whose messages were never loaded changes. A chat's shard also records the range of
+    ids and the senders of its messages, so the chats that might hold a message can be found
+    without loading them.
+    '''
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        # (chats, chat_id) -> (first message_id, last message_id, senders), None if not recorded
+        self.message_summaries = {}
+
+    def path(self, shard):
+        if shard in ("users", "counters"):
+            return os.path.join(self.directory, f"{shard}.p")
+        chats, chat_id = shard
+        return os.path.join(self.directory, f"{'channel' if chats == 'channels' else 'dm'}_{chat_id}.p")
+
+    def messages_path(self, shard):
+        return self.path(shard)[:-len(".p")] + ".messages.p"
+
+    def dump(self, store, shards):
+        '''
+        Pickles the given shards into memory. Must be called with data_store.lock held,
+        the returned blobs can then be written without it.
+
+        Arguments:
+            store       dict    - Database of Seams information
+            shards      set     - Shard keys to dump, ALL_SHARDS for the whole store
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            Returns { path: bytes or None } where None means the shard no longer exists
+        '''
+        chats_by_key = {
+            (chats, chat_id): chat for chats in ("channels", "dms") for chat_id, chat in store[chats].items()
+        }
+        blobs = {}
+        everything = ALL_SHARDS in shards
+        if everything:
+            shards = {"users", "counters"} | set(chats_by_key)
+            for name in os.listdir(self.directory):
+                if CHAT_FILE.match(name) or MESSAGES_FILE.match(name):
+                    blobs[os.path.join(self.directory, name)] = None
+
+        for shard in shards:
+            if shard == "users":
+                data = store["users"]
+            elif shard == "counters":
+                data = {"dm_count": store["dm_count"], "message_count": store["message_count"]}
+            elif shard in chats_by_key:
+                chat = chats_by_key[shard]
+                data = {key: value for key, value in chat.items() if key != "messages"}
+                if "messages" in chat:
+                    messages = chat["messages"]
+                    blobs[self.messages_path(shard)] = pickle.dumps(pack_messages(messages) if type(messages) is list else messages)
+                    self.message_summaries[shard] = message_summary(chat["messages"])
+                elif everything:
+                    # never loaded, so the file on disk is still current
+                    blobs.pop(self.messages_path(shard), None)
+                data["message_summary"] = self.message_summaries.get(shard)
+            else:
+                data = None
+                blobs[self.messages_path(shard)] = None
+                self.message_summaries.pop(shard, None)
+            blobs[self.path(shard)] = None if data is None else pickle.dumps(data)
+        return blobs
+
+    def write(self, blobs):
+        '''
+        Writes (or deletes) shard files produced by dump()
+        '''
+        for path, data in blobs.items():
+            if data is None:
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            with open(path + ".tmp", "wb") as FILE:
+                FILE.write(data)
+            os.replace(path + ".tmp", path)
+
+    def load_messages(self, chat):
+        shard = ("channels", chat["channel_id"]) if "channel_id" in chat else ("dms", chat["dm_id"])
+        if not os.path.exists(self.messages_path(shard)):
+            return []
+        with open(self.messages_path(shard), "rb") as FILE:
+            messages = unpickle(FILE.read())
+        # packed by dump(), or the records themselves as shards used to hold them
+        return unpack_messages(messages) if isinstance(messages, tuple) else messages
+
+    def message_chats(self, message_id):
+        '''
+        Returns the (chats, chat_id) whose messages' ids span message_id, or that don't record them
+        '''
+        return [
+            shard for shard, summary in self.message_summaries.items()
+            if summary is None or summary[0] <= message_id <= summary[1]
+        ]
+
+    def authored_chats(self, u_id):
+        '''
+        Returns the (chats, chat_id) u_id has sent messages in, or that don't record their senders
+        '''
+        return [
+            shard for shard, summary in self.message_summaries.items()
+            if summary is None or u_id in summary[2]
+        ]
+
+    def load(self, lazy=False):
+        '''
+        Rebuilds the whole store from the shard files
+
+        Arguments:
+            lazy        bool    - Leave out each chat's messages, for load_messages() to read later
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            Returns the store dict, or None if there are no shards yet
+        '''
+        if not os.path.exists(self.path("users")):
+            return None
+        with open(self.path("users"), "rb") as FILE:
+            users = pickle.load(FILE)
+        chats = {"channel": [], "dm": []}
+        store = {"users": users, "channels": {}, "dms": {}, "dm_count": 0, "message_count": 0}
+        if os.path.exists(self.path("counters")):
+            with open(self.path("counters"), "rb") as FILE:
+                store.update(pickle.load(FILE))
+
+        for name in os.listdir(self.directory):
+            match = CHAT_FILE.match(name)
+            if not match:
+                continue
+            with open(os.path.join(self.directory, name), "rb") as FILE:
+                data = pickle.load(FILE)
+            summary = data.pop("message_summary", None)
+            chat = CHAT_RECORDS[match.group(1) + "s"].from_dict(data)
+            self.message_summaries[chat_key(chat)] = summary
+            if not lazy:
+                chat["messages"] = self.load_messages(chat)
+            chats[match.group(1)].append(chat)
+
+        for chat in sorted(chats["channel"], key=lambda chat: chat["channel_id"]):
+            store["channels"][chat["channel_id"]] = chat
+        for chat in sorted(chats["dm"], key=lambda chat: chat["dm_id"]):
+            store["dms"][chat["dm_id"]] = chat
+        return store
@@ -0,0 +1,278 @@
+import json
+import sqlite3
+from src.data_store import data_store
+from src.records import User, Channel, Dm, Message
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS users (
+    user_id         INTEGER PRIMARY KEY,
+    user_handle     TEXT,
+    is_owner        INTEGER NOT NULL,
+    email           TEXT,
+    password        TEXT NOT NULL,
+    name_first      TEXT NOT NULL,
+    name_last       TEXT NOT NULL,
+    sessions        TEXT NOT NULL,
+    total_sessions  INTEGER NOT NULL,
+    is_active       INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_email ON users (email);
+CREATE INDEX IF NOT EXISTS users_handle ON users (user_handle);
+
+CREATE TABLE IF NOT EXISTS channels (
+    channel_id      INTEGER PRIMARY KEY,
+    name            TEXT NOT NULL,
+    is_public       INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS dms (
+    dm_id           INTEGER PRIMARY KEY,
+    name            TEXT NOT NULL
+);
+
+-- one row per (chat, user, role); rowid keeps join order for member lists
+CREATE TABLE IF NOT EXISTS members (
+    chats           TEXT NOT NULL,
+    chat_id         INTEGER NOT NULL,
+    user_id         INTEGER NOT NULL,
+    role            TEXT NOT NULL,
+    UNIQUE (chats, chat_id, user_id, role)
+);
+CREATE INDEX IF NOT EXISTS members_user ON members (user_id);
+
+CREATE TABLE IF NOT EXISTS messages (
+    message_id      INTEGER PRIMARY KEY,
+    chats           TEXT NOT NULL,
+    chat_id         INTEGER NOT NULL,
+    user_id         INTEGER NOT NULL,
+    message         TEXT NOT NULL,
+    time_sent       INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS messages_chat ON messages (chats, chat_id, message_id);
+CREATE INDEX IF NOT EXISTS messages_user ON messages (user_id);
+
+CREATE TABLE IF NOT EXISTS counters (
+    name            TEXT PRIMARY KEY,
+    value           INTEGER NOT NULL
+);
+'''
+
+USER_COLUMNS = ("user_id", "user_handle", "is_owner", "email", "password", "name_first",
+    "name_last", "sessions", "total_sessions", "is_active")
+
+class SqliteStore:
+    '''
+    Durable storage for the data store in SQLite (WAL mode). Users, chats, memberships and
+    messages live in their own indexed tables and journal records are applied as row level
+    statements, so a request only writes the rows it touched.
+    '''
+    def __init__(self, path):
+        self.path = path
+        # writes come from whichever thread commits the journal, which serialises them
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def is_empty(self):
+        return self.db.execute("SELECT COUNT(*) FROM users").fetchone()[0] == 0
+
+    def apply(self, records):
+        '''
+        Writes a batch of journal records in a single transaction
+
+        Arguments:
+            records     list    - Record dicts produced by journal.record
+
+        Exceptions:
+            ValueError  - Occurs when a record's op is not recognised
+
+        Return Value:
+            N/A
+        '''
+        with self.db:
+            for record in records:
+                self.apply_record(record)
+
+    def apply_record(self, record):
+        op = record["op"]
+        db = self.db
+        if op == "user":
+            self.write_user(record["user"])
+        elif op == "chat_create":
+            self.write_chat(record["chats"], record["chat"])
+        elif op == "chat_remove":
+            self.delete_chat(record["chats"], record["chat_id"])
+        elif op == "chat_join":
+            self.write_member(record["chats"], record["chat_id"], record["u_id"], "member")
+        elif op == "chat_leave":
+            # leaving a channel gives up ownership, a dm remembers its creator
+            roles = ("member", "owner") if record["chats"] == "channels" else ("member",)
+            for role in roles:
+                db.execute("DELETE FROM members WHERE chats = ? AND chat_id = ? AND user_id = ? AND role = ?",
+                    (record["chats"], record["chat_id"], record["u_id"], role))
+        elif op == "owner_add":
+            self.write_member(record["chats"], record["chat_id"], record["u_id"], "owner")
+        elif op == "owner_remove":
+            db.execute("DELETE FROM members WHERE chats = ? AND chat_id = ? AND user_id = ? AND role = 'owner'",
+                (record["chats"], record["chat_id"], record["u_id"]))
+        elif op == "message_send":
+            self.write_message(record["chats"], record["chat_id"], record["message"])
+        elif op == "message_edit":
+            db.execute("UPDATE messages SET message = ? WHERE message_id = ?", (record["message"], record["message_id"]))
+        elif op == "message_remove":
+            db.execute("DELETE FROM messages WHERE message_id = ?", (record["message_id"],))
+        elif op == "user_remove":
+            db.execute("UPDATE messages SET message = 'Removed user' WHERE user_id = ?", (record["user_id"],))
+            db.execute("DELETE FROM members WHERE user_id = ?", (record["user_id"],))
+            self.write_user(record["user"])
+        elif op == "clear":
+            for table in ("users", "channels", "dms", "members", "messages", "counters"):
+                db.execute(f"DELETE FROM {table}")
+        else:
+            raise ValueError(f"Unknown journal record {op}")
+
+    def write_user(self, user):
+        row = dict(user, sessions=json.dumps(user["sessions"]))
+        self.db.execute(f"INSERT OR REPLACE INTO users ({', '.join(USER_COLUMNS)}) VALUES ({', '.join('?' * len(USER_COLUMNS))})",
+            [row[column] for column in USER_COLUMNS])
+
+    def write_chat(self, chats, chat):
+        '''Writes a chat's row and members, where members are given as user ids'''
+        if chats == "channels":
+            chat_id = chat["channel_id"]
+            self.db.execute("INSERT OR REPLACE INTO channels VALUES (?, ?, ?)", (chat_id, chat["name"], chat["is_public"]))
+        else:
+            chat_id = chat["dm_id"]
+            self.db.execute("INSERT OR REPLACE INTO dms VALUES (?, ?)", (chat_id, chat["name"]))
+            self.bump_counter("dm_count", chat_id + 1)
+        for u_id in chat["all_members"]:
+            self.write_member(chats, chat_id, u_id, "member")
+        for u_id in chat["owner_members"]:
+            self.write_member(chats, chat_id, u_id, "owner")
+
+    def delete_chat(self, chats, chat_id):
+        key = "channel_id" if chats == "channels" else "dm_id"
+        self.db.execute(f"DELETE FROM {chats} WHERE {key} = ?", (chat_id,))
+        self.db.execute("DELETE FROM members WHERE chats = ? AND chat_id = ?", (chats, chat_id))
+        self.db.execute("DELETE FROM messages WHERE chats = ? AND chat_id = ?", (chats, chat_id))
+
+    def write_member(self, chats, chat_id, u_id, role):
+        self.db.execute("INSERT OR IGNORE INTO members VALUES (?, ?, ?, ?)", (chats, chat_id, u_id, role))
+
+    def write_message(self, chats, chat_id, message):
+        self.db.execute("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?)",
+            (message["message_id"], chats, chat_id, message["user_id"], message["message"], message["time_sent"]))
+        self.bump_counter("message_count", message["message_id"] + 1)
+
+    def bump_counter(self, name, value):
+        self.db.execute("INSERT INTO counters VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = MAX(value, excluded.value)",
+            (name, value))
+
+    def import_store(self, store):
+        '''
+        Replaces everything in the database with the contents of an in memory store,
+        e.g. when switching over from a datastore.p pickle
+
+        Arguments:
+            store       dict    - Database of Seams information
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            N/A
+        '''
+        with self.db:
+            self.apply_record({"op": "clear"})
+            for user in store["users"]:
+                self.write_user(user)
+            for chats, key in (("channels", "channel_id"), ("dms", "dm_id")):
+                for chat in store[chats].values():
+                    self.write_chat(chats, dict(chat,
+                        all_members=list(chat["all_members"]),
+                        owner_members=list(chat["owner_members"])))
+                    for message in data_store.all_messages(chat):
+                        self.write_message(chats, chat[key], message)
+            self.bump_counter("dm_count", store["dm_count"])
+            self.bump_counter("message_count", store["message_count"])
+
+    def load_messages(self, chats, chat_id):
+        '''
+        Returns a chat's messages, oldest first, via the (chats, chat_id, message_id) index
+        '''
+        rows = self.db.execute("SELECT message_id, user_id, message, time_sent FROM messages "
+            "WHERE chats = ? AND chat_id = ? ORDER BY message_id", (chats, chat_id))
+        return [Message(message_id, user_id, message, time_sent) for message_id, user_id, message, time_sent in rows]
+
+    def message_chats(self, message_id):
+        '''
+        Returns the (chats, chat_id) holding a message, via the primary key, as a list
+        '''
+        return [tuple(row) for row in self.db.execute(
+            "SELECT chats, chat_id FROM messages WHERE message_id = ?", (message_id,))]
+
+    def authored_chats(self, u_id):
+        '''
+        Returns every (chats, chat_id) a user has sent messages in, via the user_id index
+        '''
+        return [tuple(row) for row in self.db.execute(
+            "SELECT DISTINCT chats, chat_id FROM messages WHERE user_id = ?", (u_id,))]
+
+    def load_chat_messages(self, chat):
+        if "channel_id" in chat:
+            return self.load_messages("channels", chat["channel_id"])
+        return self.load_messages("dms", chat["dm_id"])
+
+    def load(self, lazy=False):
+        '''
+        Rebuilds the in memory store from the database
+
+        Arguments:
+            lazy        bool    - Leave out each chat's messages, for load_chat_messages() to fetch later
+
+        Exceptions:
+            N/A
+
+        Return Value:
+            Returns the store dict
+        '''
+        users = []
+        for row in self.db.execute(f"SELECT {', '.join(USER_COLUMNS)} FROM users ORDER BY user_id"):
+            user = User(**dict(zip(USER_COLUMNS, row)))
+            user["is_owner"] = bool(user["is_owner"])
+            user["is_active"] = bool(user["is_active"])
+            user["sessions"] = json.loads(user["sessions"])
+            users.append(user)
+
+        members = {}
+        for chats, chat_id, user_id, role in self.db.execute("SELECT chats, chat_id, user_id, role FROM members ORDER BY rowid"):
+            members.setdefault((chats, chat_id, role), {})[user_id] = None
+
+        def chat_members(chats, chat_id):
+            chat = {
+                'owner_members': members.get((chats, chat_id, "owner"), {}),
+                'all_members': members.get((chats, chat_id, "member"), {}),
+            }
+            if not lazy:
+                chat['messages'] = self.load_messages(chats, chat_id)
+            return chat
+
+        channels = {}
+        for channel_id, name, is_public in self.db.execute("SELECT channel_id, name, is_public FROM channels ORDER BY channel_id"):
+            channels[channel_id] = Channel(channel_id=channel_id, name=name, is_public=bool(is_public), **chat_members("channels", channel_id))
+        dms = {}
+        for dm_id, name in self.db.execute("SELECT dm_id, name FROM dms ORDER BY dm_id"):
+            dms[dm_id] = Dm(dm_id=dm_id, name=name, **chat_members("dms", dm_id))
+
+        counters = dict(self.db.execute("SELECT name, value FROM counters"))
+        return {
+            'users': users,
+            'channels': channels,
+            'dms': dms,
+            'dm_count': counters.get("dm_count", 0),
+            'message_count': counters.get("message_count", 0),
+        }
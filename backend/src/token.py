@@ -1,9 +1,17 @@
+from collections import OrderedDict
 import jwt
+from src import config
 from src.data_store import data_store
 from src.error import AccessError
 
 SECRET = "far_plants"
 
+# token -> decoded {user_id, session}, least recently used first
+decoded_tokens = OrderedDict()
+# (user_id, session) -> its decoded tokens, to drop them once the session is logged out
+session_tokens = {}
+token_cache_stats = {"hits": 0, "misses": 0}
+
 def encode(data):
     '''
     Creates a jwt (token) for a particular user given some data
@@ -21,7 +29,9 @@ def encode(data):
 
 def decode(token):
     '''
-    Given a token, decodes the data
+    Given a token, decodes the data. The last config.token_cache_size tokens decoded are kept,
+    so a client polling with the same token doesn't have it verified on every request.
+    The returned dict is shared between calls and shouldn't be changed.
 
     Arguments:
         token       str     - JWT token
@@ -32,10 +42,43 @@ def decode(token):
     Return Value:
         Returns {user_id, session} on condition that no errors occurred during decoding
     '''
+    user_data = decoded_tokens.get(token) if isinstance(token, str) else None
+    if user_data is not None:
+        token_cache_stats["hits"] += 1
+        decoded_tokens.move_to_end(token)
+        return user_data
+    token_cache_stats["misses"] += 1
     try:
-        return jwt.decode(token, SECRET, algorithms=["HS256"])
+        user_data = jwt.decode(token, SECRET, algorithms=["HS256"])
     except Exception as decode_error:
         raise AccessError(description='Invalid token') from decode_error
+    if config.token_cache_size:
+        decoded_tokens[token] = user_data
+        session_tokens.setdefault((user_data.get('user_id'), user_data.get('session')), {})[token] = None
+        if len(decoded_tokens) > config.token_cache_size:
+            oldest, oldest_data = decoded_tokens.popitem(last=False)
+            session = (oldest_data.get('user_id'), oldest_data.get('session'))
+            session_tokens[session].pop(oldest, None)
+            if not session_tokens[session]:
+                del session_tokens[session]
+    return user_data
+
+def forget_session(user_id, session):
+    '''
+    Drops the decoded tokens of a session that has been logged out or removed from decode()'s cache
+
+    Arguments:
+        user_id     int     - User the session belongs to
+        session     str     - Session that was removed
+
+    Exceptions:
+        N/A
+
+    Return Value:
+        N/A
+    '''
+    for token in session_tokens.pop((user_id, session), ()):
+        decoded_tokens.pop(token, None)
 
 def check_valid_token(user_data):
     '''
@@ -52,9 +95,8 @@ def check_valid_token(user_data):
         Returns user on condition that the user's id exists and session is valid
         Returns {} if no user was found or session is invalid
     '''
-    store = data_store.get()
-    for user in store['users']:
-        if user['user_id'] == user_data['user_id'] and user_data['session'] in user['sessions']:
-            return user
+    user = data_store.user(user_data['user_id'])
+    if user and user_data['session'] in user['sessions']:
+        return user
 
     return {}
@@ -1,6 +1,7 @@
 from src.data_store import data_store
 from src.error import InputError
 from src.auth import check_valid_name, check_valid_email, check_email_registered
+from src.journal import journal
 
 def users_all_implement():
     '''
@@ -24,13 +25,7 @@ def users_all_implement():
     for user in store['users']:
         if not user['is_active']:
             continue
-        user_profile_list['users'].append({
-            'u_id': user['user_id'],
-            'email': user['email'],
-            'name_first': user['name_first'],
-            'name_last': user['name_last'],
-            'handle_str': user['user_handle'],
-        }) 
+        user_profile_list['users'].append(user.profile())
 
     return user_profile_list
 
@@ -51,11 +46,7 @@ def check_valid_id(auth_user_id, store):
         Returns user dict on success in finding given user
         Returns empty dict on failure in finding given user
     '''
-    for user in store['users']:
-        if user['user_id'] == auth_user_id:
-            return user
-
-    return {}
+    return data_store.user(auth_user_id) or {}
 
 def user_profile_implement(user_id):
     '''
@@ -77,13 +68,7 @@ def user_profile_implement(user_id):
         raise InputError(description='Invalid user_id')
 
     user_profile = {
-        'user': {
-            'u_id': user_id,
-            'email': user['email'],
-            'name_first': user['name_first'],
-            'name_last': user['name_last'],
-            'handle_str': user['user_handle'],
-        },    
+        'user': user.profile(),
     }
     return user_profile
 
@@ -105,8 +90,8 @@ def user_profile_setname_implement(user, name_first, name_last):
     check_valid_name(name_first)
     check_valid_name(name_last)
     
-    user["name_first"] = name_first
-    user["name_last"] = name_last
+    data_store.update_user(user, {"name_first": name_first, "name_last": name_last})
+    journal.record("user", user=user)
     
 def user_profile_setemail_implement(user, email):
     '''
@@ -123,10 +108,14 @@ def user_profile_setemail_implement(user, email):
         N/A
     '''
     check_valid_email(email)
-    if check_email_registered(email, data_store.get()):
+    # emails are matched regardless of case, so a user may change the case of their own,
+    # but setting exactly the address they already have is still rejected
+    registered = check_email_registered(email, data_store.get())
+    if registered and (registered is not user or user["email"] == email):
         raise InputError(description="Email already registered")
     
-    user["email"] = email
+    data_store.update_user(user, {"email": email})
+    journal.record("user", user=user)
 
 def user_profile_sethandle_implement(user, handle_str):
     '''
@@ -149,9 +138,8 @@ def user_profile_sethandle_implement(user, handle_str):
     if not handle_str.isalnum():
         raise InputError(description="Invalid handle, can only contain alphanumeric characters")
 
-    store = data_store.get()
-    for users in store["users"]:
-        if users["user_handle"] == handle_str:
-            raise InputError(description="Handle is already being used by another user")
+    if data_store.user_by_handle(handle_str):
+        raise InputError(description="Handle is already being used by another user")
     
-    user["user_handle"] = handle_str
\ No newline at end of file
+    data_store.update_user(user, {"user_handle": handle_str})
+    journal.record("user", user=user)
\ No newline at end of file
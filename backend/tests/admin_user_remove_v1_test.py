@@ -107,3 +107,32 @@ def test_handle_reusable(reset_data, register_valid, register_second):
     user_profile_sethandle_t(register_valid["token"], "foobar")
     reuse_handle_profile = user_profile_t(register_valid["token"], register_valid["auth_user_id"]).json()
     assert reuse_handle_profile["user"]["handle_str"] == "foobar"
+
+@pytest.fixture
+def server_client(monkeypatch, tmp_path):
+    # importing the server loads persistence, so point it somewhere empty and keep its threads off
+    monkeypatch.setattr(config, "persistence", "pickle")
+    monkeypatch.setattr(config, "datastore_path", str(tmp_path / "datastore.p"))
+    monkeypatch.setattr(config, "persist_in_background", False)
+    monkeypatch.setattr(config, "compact_in_background", False)
+    from src.server import APP
+    from src.other import clear_v1
+    clear_v1()
+    yield APP.test_client()
+    clear_v1()
+
+def test_remove_user_logs_summary(server_client, caplog):
+    register = lambda email: json.loads(server_client.post("/auth/register/v2", json={"email": email,
+        "password": "the_meaning_of_everything_is_42", "name_first": "arthur", "name_last": "dent"}).data)
+    owner = register("heart@of.gold")
+    second = register("email@of.gold")
+    channel = json.loads(server_client.post("/channels/create/v2", json={"token": owner["token"], "name": "test",
+        "is_public": True}).data)
+    server_client.post("/channel/join/v2", json={"token": second["token"], "channel_id": channel["channel_id"]})
+    server_client.post("/message/send/v1", json={"token": second["token"], "channel_id": channel["channel_id"],
+        "message": "never gonna give you up"})
+    # no caplog.at_level here: the server itself has to let the message through
+    response = server_client.delete("/admin/user/remove/v1", json={"token": owner["token"],
+        "u_id": second["auth_user_id"]})
+    assert response.status_code == 200
+    assert f"Removed user {second['auth_user_id']}: rewrote 1 messages, left 1 chats" in caplog.messages
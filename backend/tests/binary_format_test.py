@@ -0,0 +1,64 @@
+import pickle
+import pytest
+from src import config
+from src import binary_format
+from src.data_store import data_store
+from src.persistence import save_persistence
+from tests.conftest import restart
+from src.auth import auth_register_v1
+from src.channels import channels_create_v1
+from src.channel import channel_join_v1
+from src.dm import dm_create, message_senddm
+from src.message import message_send
+from src.admin import admin_user_remove_implement
+from src.records import Channel, Message
+
+@pytest.fixture
+def binary_mode(persistence_mode):
+    return persistence_mode("binary")
+
+def test_binary_round_trip(binary_mode):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)
+    channel_join_v1(member["auth_user_id"], channel["channel_id"])
+    message_send(member["auth_user_id"], channel["channel_id"], "héllo ☃")
+    message_send(owner["auth_user_id"], channel["channel_id"], "\n\ttabs")
+    dm = dm_create(data_store.get()["users"][0], [member["auth_user_id"]])
+    message_senddm(member["auth_user_id"], dm["dm_id"], "psst")
+    admin_user_remove_implement(member["auth_user_id"])
+    save_persistence()
+
+    with open(config.datastore_path, "rb") as FILE:
+        assert binary_format.is_binary(FILE.read())
+    before = restart()
+    store = data_store.get()
+    assert store == before
+    assert list(store["channels"][0]["all_members"])[0] == 0
+    assert store["users"][1]["email"] is None
+
+def test_binary_reads_existing_pickle(binary_mode, monkeypatch):
+    monkeypatch.setattr(config, "persistence", "pickle")
+    auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    save_persistence()
+
+    monkeypatch.setattr(config, "persistence", "binary")
+    assert data_store.get() == restart()
+
+def test_binary_rejects_unknown_version():
+    data = bytearray(binary_format.dumps({'users': [], 'channels': {}, 'dms': {}, 'dm_count': 0, 'message_count': 0}))
+    data[len(binary_format.MAGIC)] = binary_format.VERSION + 1
+    with pytest.raises(ValueError):
+        binary_format.loads(bytes(data))
+    with pytest.raises(ValueError):
+        binary_format.loads(pickle.dumps({"users": []}))
+
+def test_binary_version_1_messages_reversed():
+    # version 1 stored each chat's messages newest first
+    newest_first = [Message(2, 0, "three", 2), Message(1, 0, "two", 1), Message(0, 0, "one", 0)]
+    channel = Channel(channel_id=0, name="Humanity", is_public=True, owner_members={0: None},
+        all_members={0: None}, messages=newest_first)
+    data = bytearray(binary_format.dumps({'users': [], 'channels': {0: channel}, 'dms': {}, 'dm_count': 0, 'message_count': 3}))
+    data[len(binary_format.MAGIC)] = 1
+    store = binary_format.loads(bytes(data))
+    assert [message["message"] for message in store["channels"][0]["messages"]] == ["one", "two", "three"]
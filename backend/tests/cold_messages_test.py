@@ -0,0 +1,116 @@
+import pytest
+from src import config
+from src.data_store import data_store
+from src import cold_messages
+from src.cold_messages import ColdStore
+from src.records import Message
+from src.persistence import save_persistence
+from tests.conftest import restart
+from src.auth import auth_register_v1
+from src.channels import channels_create_v1
+from src.channel import channel_messages_v1
+from src.dm import dm_create, dm_messages, message_senddm
+from src.message import message_send, message_edit, message_remove
+
+@pytest.fixture(params=["pickle", "sharded"])
+def tiered(request, persistence_mode):
+    return persistence_mode(request.param, hot_messages=2, cold_page_size=3)
+
+def texts(messages):
+    return [message["message"] for message in messages["messages"]]
+
+def test_old_messages_leave_memory(tiered):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)
+    for number in range(60):
+        message_send(owner["auth_user_id"], channel["channel_id"], str(number))
+    save_persistence()
+
+    chat = data_store.get()["channels"][0]
+    assert len(chat["messages"]) < config.hot_messages + config.cold_page_size
+    assert data_store.message_count(chat) == 60
+    assert texts(channel_messages_v1(owner["auth_user_id"], channel["channel_id"], 0)) == [str(n) for n in range(59, 9, -1)]
+    page = channel_messages_v1(owner["auth_user_id"], channel["channel_id"], 50)
+    assert texts(page) == [str(n) for n in range(9, -1, -1)] and page["end"] == -1
+    assert "cold_pages" in chat
+
+    restart()
+    assert texts(channel_messages_v1(owner["auth_user_id"], channel["channel_id"], 55)) == ["4", "3", "2", "1", "0"]
+
+def test_changing_cold_message(tiered):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    dm = dm_create(data_store.get()["users"][0], [])
+    for number in range(10):
+        message_senddm(owner["auth_user_id"], dm["dm_id"], str(number))
+    message_edit(owner["auth_user_id"], 8, "edited")
+    assert "cold_pages" in data_store.get()["dms"][0]
+
+    message_edit(owner["auth_user_id"], 1, "old edit")
+    message_remove(owner["auth_user_id"], 0)
+    assert texts(dm_messages(owner["auth_user_id"], dm["dm_id"], 0)) == ["9", "edited", "7", "6", "5", "4", "3", "2", "old edit"]
+    save_persistence()
+    restart()
+    assert texts(dm_messages(owner["auth_user_id"], dm["dm_id"], 0)) == ["9", "edited", "7", "6", "5", "4", "3", "2", "old edit"]
+
+def test_removed_messages_not_paged_out(tiered):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)["channel_id"]
+    for number in range(4):
+        message_send(owner["auth_user_id"], channel, str(number))
+    data_store.compact_deleted(1)
+    message_remove(owner["auth_user_id"], 1)
+    chat = data_store.get()["channels"][0]
+    assert len(chat["messages"]) == 4 and data_store.message_count(chat) == 3
+
+    message_send(owner["auth_user_id"], channel, "4")
+    message_send(owner["auth_user_id"], channel, "5")
+    assert [page["count"] for page in chat["cold_pages"]] == [3]
+    assert texts(channel_messages_v1(owner["auth_user_id"], channel, 0)) == ["5", "4", "3", "2", "0"]
+    data_store.compact_deleted(None)
+
+def test_changing_cold_message_rewrites_one_page(tiered):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)["channel_id"]
+    for number in range(20):
+        message_send(owner["auth_user_id"], channel, str(number))
+    chat = data_store.get()["channels"][0]
+    pages = list(chat["cold_pages"])
+    assert [page["count"] for page in pages] == [3] * 6
+
+    message_edit(owner["auth_user_id"], 4, "edited")
+    message_remove(owner["auth_user_id"], 0)
+    assert len(chat["messages"]) == 2
+    assert chat["cold_pages"][2:] == pages[2:]
+    assert [page["count"] for page in chat["cold_pages"]] == [2, 3, 3, 3, 3, 3]
+    assert chat["cold_pages"][1]["size"] == pages[1]["size"] + len("edited") - 1
+
+    message_send(owner["auth_user_id"], channel, "20")
+    assert all(page["count"] <= config.cold_page_size for page in chat["cold_pages"])
+    assert texts(channel_messages_v1(owner["auth_user_id"], channel, 0)) == (
+        [str(n) for n in range(20, 4, -1)] + ["edited", "3", "2", "1"]
+    )
+
+def test_replaced_pages_reclaimed(tiered, monkeypatch):
+    # every page in a segment of its own
+    monkeypatch.setattr(cold_messages, "SEGMENT_BYTES", 1)
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)["channel_id"]
+    for number in range(11):
+        message_send(owner["auth_user_id"], channel, str(number))
+    first = data_store.get()["channels"][0]["cold_pages"][0]["segment"]
+    message_edit(owner["auth_user_id"], 0, "edited")
+    save_persistence()
+    assert first in data_store.cold.segments()
+
+    restart()
+    assert first not in data_store.cold.segments()
+    page = channel_messages_v1(owner["auth_user_id"], channel, 0)
+    assert texts(page) == [str(n) for n in range(10, 0, -1)] + ["edited"]
+
+def test_sparse_segments_found(tmp_path):
+    cold = ColdStore(str(tmp_path / "messages"), 2)
+    pages = [cold.write([Message(n, 0, "x" * 100, 0), Message(n + 1, 0, "x" * 100, 0)]) for n in (0, 2, 4)]
+    cold.segment += 1
+    assert cold.reclaim(pages[:1]) == {0}
+    assert cold.reclaim([]) == set() and cold.segments() == []
+    cold.close()
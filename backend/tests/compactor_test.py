@@ -0,0 +1,76 @@
+import pytest
+from src.data_store import data_store
+from src.compactor import start_compactor, stop_compactor
+from src.message_columns import MessageColumns
+from src.other import clear_v1
+from src.auth import auth_register_v1
+from src.channels import channels_create_v1
+from src.channel import channel_messages_v1
+from src.message import message_send, message_edit, message_remove
+from src.error import InputError
+
+@pytest.fixture
+def channel():
+    clear_v1()
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")["auth_user_id"]
+    channel_id = channels_create_v1(owner, "Humanity", True)["channel_id"]
+    yield owner, channel_id, data_store.get()["channels"][channel_id]
+    data_store.compact_deleted(None)
+    data_store.columnar_messages(None)
+    clear_v1()
+
+def texts(page):
+    return [message["message"] for message in page["messages"]]
+
+def test_removal_marks_until_ratio_reached(channel):
+    owner, channel_id, chat = channel
+    data_store.compact_deleted(0.5)
+    sent = [message_send(owner, channel_id, str(n))["message_id"] for n in range(4)]
+    message_remove(owner, sent[1])
+    assert len(chat["messages"]) == 4
+    assert data_store.message_count(chat) == 3
+    assert texts(channel_messages_v1(owner, channel_id, 0)) == ["3", "2", "0"]
+    with pytest.raises(InputError):
+        message_edit(owner, sent[1], "back")
+    message_remove(owner, sent[2])
+    assert [message["message"] for message in chat["messages"]] == ["0", "3"]
+    assert data_store.message_count(chat) == 2
+
+def test_pages_stay_full_around_removed_messages(channel):
+    owner, channel_id, chat = channel
+    data_store.compact_deleted(1)
+    sent = [message_send(owner, channel_id, str(n))["message_id"] for n in range(120)]
+    for message_id in sent[::3]:
+        message_remove(owner, message_id)
+    live = [str(n) for n in reversed(range(120)) if n % 3]
+    assert len(chat["messages"]) == 120
+    first = channel_messages_v1(owner, channel_id, 0)
+    assert texts(first) == live[:50] and first["end"] == 50
+    second = channel_messages_v1(owner, channel_id, 50)
+    assert texts(second) == live[50:] and second["end"] == -1
+    assert [message["message"] for message in data_store.all_messages(chat)] == live[::-1]
+
+def test_columns_compacted(channel):
+    owner, channel_id, chat = channel
+    data_store.columnar_messages(2)
+    data_store.compact_deleted(0.5)
+    sent = [message_send(owner, channel_id, str(n))["message_id"] for n in range(4)]
+    message_remove(owner, sent[0])
+    assert isinstance(chat["messages"], MessageColumns) and len(chat["messages"]) == 4
+    assert texts(channel_messages_v1(owner, channel_id, 0)) == ["3", "2", "1"]
+    message_remove(owner, sent[3])
+    assert isinstance(chat["messages"], MessageColumns)
+    assert [message["message"] for message in chat["messages"]] == ["1", "2"]
+
+def test_background_compaction(channel):
+    owner, channel_id, chat = channel
+    data_store.compact_deleted(0.25)
+    start_compactor()
+    try:
+        sent = [message_send(owner, channel_id, str(n))["message_id"] for n in range(4)]
+        message_remove(owner, sent[2])
+        assert texts(channel_messages_v1(owner, channel_id, 0)) == ["3", "1", "0"]
+    finally:
+        stop_compactor()
+    assert [message["message"] for message in chat["messages"]] == ["0", "1", "3"]
+    assert not data_store.compact_in_background
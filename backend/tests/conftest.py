@@ -0,0 +1,66 @@
+import pickle
+import pytest
+from src import config
+from src.data_store import data_store
+from src.journal import journal
+from src.persistence import load_persistence
+from src.other import clear_v1
+
+# where each persistence setting points under the test's tmp_path
+PATHS = {
+    "datastore_path": "datastore.p",
+    "journal_path": "datastore.journal",
+    "sqlite_path": "datastore.db",
+    "shard_path": "shards",
+    "cold_path": "cold/messages",
+}
+
+@pytest.fixture
+def persistence_mode(tmp_path, monkeypatch):
+    '''
+    Switches the tests to a persistence mode with every file kept under tmp_path
+
+    Arguments:
+        N/A
+
+    Exceptions:
+        N/A
+
+    Return Value:
+        Returns a function taking the mode and any other config settings to override, which
+        starts from an empty store loaded the way the server would and returns tmp_path
+    '''
+    def switch(mode, **settings):
+        monkeypatch.setattr(config, "persistence", mode)
+        for setting, path in PATHS.items():
+            monkeypatch.setattr(config, setting, str(tmp_path / path))
+        for setting, value in settings.items():
+            monkeypatch.setattr(config, setting, value)
+        clear_v1()
+        load_persistence()
+        return tmp_path
+    yield switch
+    journal.close()
+    if data_store.cold is not None:
+        data_store.cold.close()
+    data_store.tier_messages(None, None)
+    clear_v1()
+
+def restart():
+    '''
+    Throws away the in memory store and rebuilds it from disk, as a fresh server would
+
+    Arguments:
+        N/A
+
+    Exceptions:
+        N/A
+
+    Return Value:
+        Returns a copy of the store as it was before the restart
+    '''
+    before = pickle.dumps(data_store.get())
+    journal.close()
+    data_store.set({'users': [], 'channels': {}, 'dms': {}, 'dm_count': 0, 'message_count': 0})
+    load_persistence()
+    return pickle.loads(before)
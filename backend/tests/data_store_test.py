@@ -0,0 +1,237 @@
+import pickle
+import pytest
+from src.data_store import data_store
+from src.records import User
+from src.persistence import apply_record
+from src.other import clear_v1
+from src.auth import auth_register_v1, auth_login_v1, create_new_handle
+from src.admin import admin_user_remove_implement, admin_userpermission_change_implement, num_global_owners
+from src.token import check_valid_token, decode
+from src.user import user_profile_setemail_implement, user_profile_sethandle_implement, user_profile_setname_implement
+from src.error import InputError
+from src.channels import channels_create_v1, channels_list_v1, channels_listall_v1
+from src.channel import check_valid_id, channel_join_v1, channel_invite_v1, channel_messages_v1
+from src.channel_edit import channel_leave
+from src.dm import dm_create, dm_remove, dm_leave, dm_list, get_dm, message_senddm
+from src.message import message_send, message_edit, message_remove
+
+@pytest.fixture
+def store():
+    clear_v1()
+    yield data_store.get()
+    clear_v1()
+
+def test_user_index_follows_registration_and_removal(store):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    assert data_store.user(member["auth_user_id"]) is store["users"][1]
+    assert check_valid_token(decode(member["token"])) is store["users"][1]
+
+    admin_user_remove_implement(member["auth_user_id"])
+    assert data_store.user(member["auth_user_id"]) is store["users"][1]
+    assert not check_valid_id(member["auth_user_id"], store)
+    assert not check_valid_token(decode(member["token"]))
+    assert check_valid_id(owner["auth_user_id"], store)
+
+    clear_v1()
+    assert data_store.user(owner["auth_user_id"]) is None
+    assert not check_valid_token(decode(owner["token"]))
+
+def test_user_index_follows_store_replacement(store):
+    auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    login = auth_login_v1("heart@of.gold", "password")
+    user = User(**dict(store["users"][0], sessions=list(store["users"][0]["sessions"])))
+    data_store.set({'users': [user], 'channels': [], 'dms': [], 'dm_count': 0, 'message_count': 0})
+    assert data_store.user(0) is user
+    assert check_valid_token(decode(login["token"])) is user
+
+def test_user_index_follows_journal_replay(store):
+    apply_record(store, {"op": "user", "user": {"user_id": 0, "user_handle": "arthurdent", "is_owner": True,
+        "email": "heart@of.gold", "password": "x", "name_first": "arthur", "name_last": "dent",
+        "sessions": ["now"], "total_sessions": 1, "is_active": True}})
+    assert data_store.user(0) is store["users"][0]
+    apply_record(store, {"op": "clear"})
+    assert data_store.user(0) is None
+
+def test_email_index_follows_setemail_and_removal(store):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    assert data_store.user_by_email("Heart@Of.Gold") is store["users"][0]
+    with pytest.raises(InputError):
+        auth_register_v1("HEART@of.gold", "password", "zaphod", "beeblebrox")
+
+    user_profile_setemail_implement(store["users"][0], "new@of.gold")
+    assert data_store.user_by_email("heart@of.gold") is None
+    assert auth_login_v1("new@of.gold", "password")["auth_user_id"] == owner["auth_user_id"]
+    with pytest.raises(InputError):
+        auth_login_v1("heart@of.gold", "password")
+
+    admin_user_remove_implement(member["auth_user_id"])
+    assert data_store.user_by_email("email@of.gold") is None
+    assert auth_register_v1("email@of.gold", "password", "ford", "prefect")["auth_user_id"] == 2
+
+def test_handles_take_smallest_unused_suffix(store):
+    for _ in range(4):
+        auth_register_v1(f"{len(store['users'])}@of.gold", "password", "arthur", "dent")
+    assert [user["user_handle"] for user in store["users"]] == ["arthurdent", "arthurdent0", "arthurdent1", "arthurdent2"]
+
+    user_profile_sethandle_implement(store["users"][1], "zaphod")
+    admin_user_remove_implement(3)
+    assert data_store.user_by_handle("arthurdent0") is None
+    assert data_store.user_by_handle("zaphod") is store["users"][1]
+    with pytest.raises(InputError):
+        user_profile_sethandle_implement(store["users"][2], "zaphod")
+
+    assert create_new_handle("arthur", "dent", store) == "arthurdent0"
+    for _ in range(3):
+        auth_register_v1(f"{len(store['users'])}@of.gold", "password", "arthur", "dent")
+    assert [user["user_handle"] for user in store["users"][4:]] == ["arthurdent0", "arthurdent2", "arthurdent3"]
+
+def test_chats_keyed_by_id(store):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    dms = [dm_create(store["users"][0], [])["dm_id"] for _ in range(3)]
+    dm_remove(store["users"][0], dms[1])
+    assert list(store["dms"]) == [dms[0], dms[2]]
+    assert get_dm(dms[2], store)["dm_id"] == dms[2]
+    assert not get_dm(dms[1], store)
+
+    # stores saved while chats were held in lists
+    channel = {"channel_id": 0, "name": "Humanity", "is_public": True, "owner_members": [store["users"][0]],
+        "all_members": [store["users"][0]], "messages": []}
+    data_store.set({'users': store["users"], 'channels': [channel], 'dms': [], 'dm_count': 0, 'message_count': 0})
+    assert data_store.get()["channels"] == {0: channel}
+    assert channel["all_members"] == {owner["auth_user_id"]: None}
+    assert channels_listall_v1(owner["auth_user_id"]) == {"channels": [{"channel_id": 0, "name": "Humanity"}]}
+
+def test_membership_index_follows_joins_and_leaves(store):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    first = channels_create_v1(owner["auth_user_id"], "first", True)["channel_id"]
+    second = channels_create_v1(member["auth_user_id"], "second", True)["channel_id"]
+    channel_join_v1(owner["auth_user_id"], second)
+    channel_invite_v1(owner["auth_user_id"], first, member["auth_user_id"])
+    dm = dm_create(store["users"][0], [member["auth_user_id"]])["dm_id"]
+    assert list(data_store.user_chats("channels", owner["auth_user_id"])) == [first, second]
+    assert [channel["channel_id"] for channel in channels_list_v1(member["auth_user_id"])["channels"]] == [first, second]
+    assert [dm["dm_id"] for dm in dm_list(member["auth_user_id"])["dms"]] == [dm]
+
+    channel_leave(owner["auth_user_id"], first)
+    dm_leave(owner["auth_user_id"], dm)
+    assert list(data_store.user_chats("channels", owner["auth_user_id"])) == [second]
+    assert not data_store.user_chats("dms", owner["auth_user_id"])
+
+    admin_user_remove_implement(member["auth_user_id"])
+    assert not data_store.user_chats("channels", member["auth_user_id"])
+    assert not data_store.user_chats("dms", member["auth_user_id"])
+
+    data_store.set({'users': store["users"], 'channels': dict(store["channels"]), 'dms': {}, 'dm_count': 0, 'message_count': 0})
+    assert list(data_store.user_chats("channels", owner["auth_user_id"])) == [second]
+
+def test_message_locator_follows_sends_and_removals(store):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)["channel_id"]
+    dm = dm_create(store["users"][0], [])["dm_id"]
+    sent = [message_send(owner["auth_user_id"], channel, str(n))["message_id"] for n in range(5)]
+    in_dm = message_senddm(owner["auth_user_id"], dm, "psst")["message_id"]
+
+    chats, chat, messages, index = data_store.locate_message(sent[1])
+    assert (chats, chat["channel_id"], messages[index]["message"]) == ("channels", channel, "1")
+    assert data_store.locate_message(in_dm)[:2] == ("dms", store["dms"][dm])
+
+    message_remove(owner["auth_user_id"], sent[2])
+    message_edit(owner["auth_user_id"], sent[1], "edited")
+    assert data_store.locate_message(sent[2]) is None
+    assert [message["message"] for message in store["channels"][channel]["messages"]] == ["0", "edited", "3", "4"]
+
+    dm_remove(store["users"][0], dm)
+    assert data_store.locate_message(in_dm) is None
+    with pytest.raises(InputError):
+        message_edit(owner["auth_user_id"], in_dm, "gone")
+
+    # a replaced store is indexed afresh
+    data_store.set({'users': store["users"], 'channels': dict(store["channels"]), 'dms': {}, 'dm_count': 1, 'message_count': 6})
+    assert data_store.locate_message(sent[0])[3] == 0
+
+def test_user_removal_touches_only_their_messages_and_chats(store):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)["channel_id"]
+    channel_join_v1(member["auth_user_id"], channel)
+    left = dm_create(store["users"][1], [owner["auth_user_id"]])["dm_id"]
+    message_senddm(member["auth_user_id"], left, "bye")
+    dm_leave(member["auth_user_id"], left)
+    kept = message_send(owner["auth_user_id"], channel, "hello")["message_id"]
+    sent = message_send(member["auth_user_id"], channel, "hi")["message_id"]
+    gone = message_send(member["auth_user_id"], channel, "oops")["message_id"]
+    message_remove(member["auth_user_id"], gone)
+    assert list(data_store.authored_messages(member["auth_user_id"])) == [0, sent]
+    assert list(data_store.owned_chats("dms", member["auth_user_id"])) == [left]
+
+    assert admin_user_remove_implement(member["auth_user_id"]) == {"messages": 2, "chats": 1}
+    assert store["dms"][left]["messages"][0]["message"] == "Removed user"
+    assert [message["message"] for message in store["channels"][channel]["messages"]] == ["hello", "Removed user"]
+    assert data_store.locate_message(kept)[1] is store["channels"][channel]
+    assert not store["dms"][left]["owner_members"]
+    assert not data_store.owned_chats("dms", member["auth_user_id"])
+
+def test_messages_kept_in_order_sent(store):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)["channel_id"]
+    for n in range(60):
+        message_send(owner["auth_user_id"], channel, str(n))
+    assert [message["message_id"] for message in store["channels"][channel]["messages"]] == list(range(60))
+    page = channel_messages_v1(owner["auth_user_id"], channel, 5)
+    assert [message["message"] for message in page["messages"]] == [str(n) for n in range(54, 4, -1)]
+    assert page["end"] == 55
+    page = channel_messages_v1(owner["auth_user_id"], channel, 55)
+    assert [message["message"] for message in page["messages"]] == ["4", "3", "2", "1", "0"]
+    assert page["end"] == -1
+
+    # stores saved while messages were held newest first
+    old = dict(store["channels"][channel], messages=store["channels"][channel]["messages"][::-1])
+    data_store.set({'users': store["users"], 'channels': {channel: old}, 'dms': {}, 'dm_count': 0, 'message_count': 60})
+    assert data_store.get()["channels"][channel]["messages"][0]["message"] == "0"
+    assert data_store.locate_message(59)[3] == 59
+
+def test_global_owner_count(store):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    assert num_global_owners() == 1
+
+    admin_userpermission_change_implement(member["auth_user_id"], 1)
+    assert num_global_owners() == 2
+    admin_userpermission_change_implement(owner["auth_user_id"], 2)
+    assert num_global_owners() == 1
+    with pytest.raises(InputError):
+        admin_userpermission_change_implement(member["auth_user_id"], 2)
+
+    admin_userpermission_change_implement(owner["auth_user_id"], 1)
+    admin_user_remove_implement(member["auth_user_id"])
+    assert num_global_owners() == 1
+    data_store.set({'users': list(store["users"]), 'channels': {}, 'dms': {}, 'dm_count': 0, 'message_count': 0})
+    assert num_global_owners() == 1
+
+def test_names_and_handles_interned(store):
+    first = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    second = auth_register_v1("email@of.gold", "password", "arthur", "".join(["pre", "fect"]))
+    user_profile_setname_implement(store["users"][first["auth_user_id"]], "ford", "".join(["pre", "fect"]))
+    users = store["users"]
+    assert users[0]["name_last"] is users[1]["name_last"]
+    assert data_store.user_by_handle("arthurprefect")["user_handle"] is users[1]["user_handle"]
+
+def test_repeated_message_texts_pooled(store):
+    data_store.pool_messages(2)
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)["channel_id"]
+    channel_join_v1(member["auth_user_id"], channel)
+    for text in ("ok", "+1", "a" * 65, "ok", "+1"):
+        message_send(member["auth_user_id"], channel, "".join(text))
+    message_send(owner["auth_user_id"], channel, "".join(["o", "k"]))
+    messages = store["channels"][channel]["messages"]
+    assert messages[0]["message"] is messages[3]["message"] is messages[5]["message"]
+    assert messages[1]["message"] is messages[4]["message"]
+
+    admin_user_remove_implement(member["auth_user_id"])
+    assert pickle.dumps(store).count(b"Removed user") == 1
+    data_store.pool_messages(None)
@@ -0,0 +1,125 @@
+import os
+import pickle
+import pytest
+from src import config
+from src.data_store import data_store
+from src.journal import journal
+from src.persistence import load_persistence, save_persistence, stop_persistence, wait_for_snapshot
+from tests.conftest import restart
+from src.auth import auth_register_v1
+from src.channels import channels_create_v1
+from src.channel import channel_join_v1, channel_messages_v1, channel_details_v1
+from src.channel_edit import channel_addowner
+from src.dm import dm_create, dm_remove, message_senddm, dm_messages
+from src.message import message_send, message_edit, message_remove
+from src.admin import admin_user_remove_implement
+
+@pytest.fixture
+def journal_mode(persistence_mode):
+    return persistence_mode("journal", journal_fsync="always")
+
+def test_journal_appends_one_record_per_mutation(journal_mode):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    channels_create_v1(owner["auth_user_id"], "Humanity", True)
+    assert not list(journal.read())
+    save_persistence()
+    assert [record["op"] for record in journal.read()] == ["user", "chat_create"]
+
+def test_journal_replay_matches_live_store(journal_mode):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)
+    channel_join_v1(member["auth_user_id"], channel["channel_id"])
+    channel_addowner(data_store.get()["users"][0], channel["channel_id"], member["auth_user_id"])
+    kept = message_send(member["auth_user_id"], channel["channel_id"], "hello")
+    edited = message_send(owner["auth_user_id"], channel["channel_id"], "typo")
+    removed = message_send(owner["auth_user_id"], channel["channel_id"], "oops")
+    message_edit(owner["auth_user_id"], edited["message_id"], "fixed")
+    message_remove(owner["auth_user_id"], removed["message_id"])
+    dm = dm_create(data_store.get()["users"][0], [member["auth_user_id"]])
+    message_senddm(member["auth_user_id"], dm["dm_id"], "psst")
+    gone = dm_create(data_store.get()["users"][1], [])
+    dm_remove(data_store.get()["users"][1], gone["dm_id"])
+    admin_user_remove_implement(member["auth_user_id"])
+    save_persistence()
+
+    before = restart()
+    assert data_store.get() == before
+
+    store = data_store.get()
+    assert list(store["channels"][0]["all_members"])[0] == 0
+    messages = channel_messages_v1(owner["auth_user_id"], channel["channel_id"], 0)["messages"]
+    assert [message["message"] for message in messages] == ["fixed", "Removed user"]
+    assert [message["message_id"] for message in messages] == [edited["message_id"], kept["message_id"]]
+    assert dm_messages(owner["auth_user_id"], dm["dm_id"], 0)["messages"][0]["message"] == "Removed user"
+    assert len(channel_details_v1(owner["auth_user_id"], channel["channel_id"])["all_members"]) == 1
+
+def test_journal_replay_ignores_torn_record(journal_mode):
+    auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    save_persistence()
+    with open(journal.path, "a") as log:
+        log.write('{"op":"user","user":{"user_id"')
+
+    restart()
+    assert len(data_store.get()["users"]) == 1
+
+    auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    save_persistence()
+    restart()
+    assert len(data_store.get()["users"]) == 2
+
+def test_journal_rejects_unknown_fsync_policy(journal_mode):
+    with pytest.raises(ValueError):
+        journal.open(config.journal_path, "sometimes")
+
+@pytest.mark.parametrize("fork", [False, pytest.param(True, marks=pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork"))])
+def test_snapshot_compacts_journal_and_bounds_replay(journal_mode, monkeypatch, fork):
+    monkeypatch.setattr(config, "snapshot_every", 3)
+    monkeypatch.setattr(config, "snapshot_fork", fork)
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)
+    for message in ["one", "two", "three", "four", "five"]:
+        message_send(owner["auth_user_id"], channel["channel_id"], message)
+        save_persistence()
+        wait_for_snapshot()
+    stop_persistence()
+
+    assert journal.segments() == [3]
+    before = pickle.dumps(data_store.get())
+    journal.close()
+    data_store.set({'users': [], 'channels': {}, 'dms': {}, 'dm_count': 0, 'message_count': 0})
+    assert load_persistence()["records"] == 1
+    assert data_store.get() == pickle.loads(before)
+
+def test_replayed_records_count_towards_snapshot(journal_mode, monkeypatch):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)
+    message_send(owner["auth_user_id"], channel["channel_id"], "one")
+    save_persistence()
+    journal.close()
+    monkeypatch.setattr(config, "snapshot_every", 3)
+    assert load_persistence()["records"] == 3
+    wait_for_snapshot()
+    journal.close()
+    assert load_persistence()["records"] == 0
+
+def test_writes_after_snapshot_survive_restart(journal_mode, monkeypatch):
+    monkeypatch.setattr(config, "snapshot_every", 2)
+    auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    save_persistence()
+    wait_for_snapshot()
+    assert journal.segments() == []
+
+    restart()
+    auth_register_v1("third@of.gold", "password", "zaphod", "beeblebrox")
+    save_persistence()
+    restart()
+    assert len(data_store.get()["users"]) == 3
+
+def test_startup_reports_replay(journal_mode, capsys):
+    auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    save_persistence()
+    journal.close()
+    assert load_persistence()["records"] == 1
+    assert "Replayed 1 journal records" in capsys.readouterr().out
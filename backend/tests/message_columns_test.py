@@ -0,0 +1,58 @@
+import pickle
+import pytest
+from src.data_store import data_store
+from src.message_columns import MessageColumns
+from src.records import Message
+from src.other import clear_v1
+from src.auth import auth_register_v1
+from src.channels import channels_create_v1
+from src.channel import channel_messages_v1
+from src.dm import dm_create, message_senddm, dm_messages
+from src.message import message_send, message_edit, message_remove
+from src.admin import admin_user_remove_implement
+
+@pytest.fixture
+def columnar():
+    clear_v1()
+    data_store.columnar_messages(3)
+    yield data_store.get()
+    data_store.columnar_messages(None)
+    clear_v1()
+
+def test_columns_behave_like_a_list():
+    messages = [Message(n, n % 2, str(n), 1650000000 + n) for n in range(5)]
+    columns = MessageColumns(messages)
+    assert len(columns) == 5 and list(columns) == messages
+    assert columns[-1] == messages[-1] and columns[1:3] == messages[1:3]
+    columns[2] = Message(2, 0, "edited", 0)
+    del columns[0]
+    columns.append(Message(5, 1, "5", 1650000005))
+    assert [message["message"] for message in columns] == ["1", "edited", "3", "4", "5"]
+    columns[:0] = messages[:1]
+    del columns[:2]
+    assert columns[0]["message"] == "edited"
+    assert pickle.loads(pickle.dumps(columns)) == columns
+
+def test_busy_chats_switch_to_columns(columnar):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)["channel_id"]
+    dm = dm_create(columnar["users"][0], [member["auth_user_id"]])["dm_id"]
+    message_send(owner["auth_user_id"], channel, "one")
+    message_send(owner["auth_user_id"], channel, "two")
+    assert isinstance(columnar["channels"][channel]["messages"], list)
+    sent = [message_senddm(member["auth_user_id"], dm, str(n))["message_id"] for n in range(4)]
+    message_send(owner["auth_user_id"], channel, "three")
+    assert isinstance(columnar["channels"][channel]["messages"], MessageColumns)
+    assert isinstance(columnar["dms"][dm]["messages"], MessageColumns)
+
+    message_edit(owner["auth_user_id"], 1, "edited")
+    message_remove(member["auth_user_id"], sent[1])
+    messages = channel_messages_v1(owner["auth_user_id"], channel, 0)
+    assert [message["message"] for message in messages["messages"]] == ["three", "edited", "one"]
+    assert messages["end"] == -1
+
+    assert admin_user_remove_implement(member["auth_user_id"]) == {"messages": 3, "chats": 1}
+    assert [message["message"] for message in dm_messages(owner["auth_user_id"], dm, 0)["messages"]] == [
+        "Removed user"
+    ] * 3
@@ -121,20 +121,20 @@ def test_message_edit_user_no_longer_in_dm(reset_data, register_valid):
     )
     assert response.status_code == InputError.code
 
-# def test_message_edit_user_not_sender_nor_owner_channel(reset_data, register_valid, register_second):
-#     channel = channels_create_t(register_valid['token'], 'General', True)
-#     message = message_send_t(
-#         register_valid['token'], 
-#         channel.json()['channel_id'], 
-#         "Andrew Taylor says don't ask your tutor or classmates out"
-#     )
-#     channel_join_t(register_second['token'], channel.json()['channel_id'])
-#     response = message_edit_t(
-#         register_second['token'],
-#         message.json()['message_id'],
-#         "Hello"
-#     )
-#     assert response.status_code == AccessError.code
+def test_message_edit_user_not_sender_nor_owner_channel(reset_data, register_valid, register_second):
+    channel = channels_create_t(register_valid['token'], 'General', True)
+    message = message_send_t(
+        register_valid['token'], 
+        channel.json()['channel_id'], 
+        "Andrew Taylor says don't ask your tutor or classmates out"
+    )
+    channel_join_t(register_second['token'], channel.json()['channel_id'])
+    response = message_edit_t(
+        register_second['token'],
+        message.json()['message_id'],
+        "Hello"
+    )
+    assert response.status_code == AccessError.code
 
 def test_message_edit_user_not_sender_nor_owner_dm(reset_data, register_valid, register_second):
     direct_message = dm_create_t(register_valid['token'], [register_second['auth_user_id']])
@@ -0,0 +1,113 @@
+import os
+import time
+import pickle
+import pytest
+from src import config
+from src import persistence
+from src.data_store import data_store
+from src.persistence import save_persistence, start_persistence, stop_persistence, get_snapshot_stats, wait_for_snapshot
+from src.auth import auth_register_v1
+from src.channels import channels_create_v1, channels_list_v1
+from src.user import users_all_implement, user_profile_setname_implement
+
+@pytest.fixture
+def pickle_mode(persistence_mode):
+    return persistence_mode("pickle")
+
+def test_mutation_marks_store_dirty(pickle_mode):
+    generation = data_store.generation
+    auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    assert data_store.generation != generation
+    assert save_persistence()
+    assert os.path.exists(config.datastore_path)
+
+def test_read_only_requests_skip_persistence(pickle_mode):
+    user = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    channels_create_v1(user["auth_user_id"], "Humanity", True)
+    assert save_persistence()
+    os.remove(config.datastore_path)
+
+    channels_list_v1(user["auth_user_id"])
+    users_all_implement()
+    assert not save_persistence()
+    assert not os.path.exists(config.datastore_path)
+
+def test_in_place_edit_marks_store_dirty(pickle_mode):
+    auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    save_persistence()
+    user_profile_setname_implement(data_store.get()["users"][0], "ford", "prefect")
+    assert save_persistence()
+
+def test_background_persister_defers_write_until_flush(pickle_mode):
+    start_persistence(interval=60)
+    auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    assert not save_persistence()
+    assert not os.path.exists(config.datastore_path)
+
+    stop_persistence()
+    assert os.path.exists(config.datastore_path)
+    assert not save_persistence()
+
+def test_background_persister_flushes_after_batch(pickle_mode, monkeypatch):
+    monkeypatch.setattr(config, "persist_batch", 1)
+    start_persistence(interval=60)
+    auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    save_persistence()
+    for _ in range(100):
+        if os.path.exists(config.datastore_path):
+            break
+        time.sleep(0.01)
+    assert os.path.exists(config.datastore_path)
+    stop_persistence()
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_snapshot(pickle_mode, monkeypatch):
+    monkeypatch.setattr(config, "snapshot_fork", True)
+    # the forked child waits for a byte on the pipe before writing
+    release, hold = os.pipe()
+    write_datastore = persistence.write_datastore
+    def held_write(data, sync=False):
+        os.read(release, 1)
+        write_datastore(data, sync)
+    monkeypatch.setattr(persistence, "write_datastore", held_write)
+
+    auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    assert save_persistence()
+    assert get_snapshot_stats()["in_progress"]
+    auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    assert not save_persistence()
+
+    os.write(hold, b"x")
+    wait_for_snapshot()
+    stats = get_snapshot_stats()
+    assert not stats["in_progress"] and stats["last_status"] == "ok"
+    assert stats["bytes"] == os.path.getsize(config.datastore_path)
+    assert stats["last_success"] <= time.time()
+    with open(config.datastore_path, "rb") as FILE:
+        assert len(pickle.load(FILE)["users"]) == 1
+
+    os.write(hold, b"x")
+    assert save_persistence()
+    wait_for_snapshot()
+    with open(config.datastore_path, "rb") as FILE:
+        assert len(pickle.load(FILE)["users"]) == 2
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_failed_snapshot_retried(pickle_mode, monkeypatch):
+    monkeypatch.setattr(config, "snapshot_fork", True)
+    write_datastore = persistence.write_datastore
+    def failing_write(data, sync=False):
+        raise OSError("No space left on device")
+    monkeypatch.setattr(persistence, "write_datastore", failing_write)
+    auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    assert save_persistence()
+    wait_for_snapshot()
+    assert get_snapshot_stats()["last_status"] == "failed"
+
+    monkeypatch.setattr(persistence, "write_datastore", write_datastore)
+    monkeypatch.setattr(config, "snapshot_fork", False)
+    start_persistence(interval=60)
+    assert not save_persistence()
+    stop_persistence()
+    with open(config.datastore_path, "rb") as FILE:
+        assert len(pickle.load(FILE)["users"]) == 1
@@ -0,0 +1,67 @@
+import json
+import pickle
+import pytest
+from src.records import User, Channel, Message, to_json
+from src.data_store import data_store
+from src.other import clear_v1
+from src.auth import auth_register_v1
+from src.channels import channels_create_v1
+from src.channel import channel_messages_v1
+from src.message import message_send
+
+@pytest.fixture
+def store():
+    clear_v1()
+    yield data_store.get()
+    clear_v1()
+
+def test_records_read_like_dicts():
+    channel = Channel(channel_id=0, name="Humanity", is_public=True, owner_members={}, all_members={})
+    assert channel["name"] == "Humanity"
+    assert "messages" not in channel and channel.get("cold_pages") is None
+    with pytest.raises(KeyError):
+        channel["messages"]
+    channel.setdefault("cold_pages", []).append("page")
+    assert channel.pop("cold_pages") == ["page"]
+    assert "cold_pages" not in channel
+    assert "keys" not in channel
+
+    message = Message(0, 1, "hello", 1650000000)
+    message["message"] = "edited"
+    assert message == {"message_id": 0, "user_id": 1, "message": "edited", "time_sent": 1650000000}
+    assert pickle.loads(pickle.dumps(message)) == message
+    assert pickle.loads(pickle.dumps(channel)) == channel
+    assert json.loads(json.dumps({"message": message}, default=to_json))["message"] == message.to_dict()
+    assert not hasattr(message, "__dict__")
+
+def test_chat_messages_pickled_as_columns():
+    messages = [Message(n, n % 3, None if n == 2 else f"message {n}", 1650000000 + n) for n in range(5)]
+    channel = Channel(channel_id=0, name="Humanity", is_public=True, owner_members={}, all_members={}, messages=messages)
+    assert channel.__reduce__()[0] is not Channel
+    restored = pickle.loads(pickle.dumps(channel))
+    assert restored == channel and type(restored["messages"]) is list
+    assert all(type(message) is Message for message in restored["messages"])
+
+def test_store_holds_records(store):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)["channel_id"]
+    message_send(owner["auth_user_id"], channel, "hello")
+    assert isinstance(store["users"][0], User)
+    assert isinstance(store["channels"][channel], Channel)
+    assert isinstance(store["channels"][channel]["messages"][0], Message)
+    assert channel_messages_v1(owner["auth_user_id"], channel, 0)["messages"][0].keys() == {
+        "message_id", "u_id", "message", "time_sent"
+    }
+
+def test_dict_store_upgraded_to_records(store):
+    user = {"user_id": 0, "user_handle": "arthurdent", "is_owner": True, "email": "heart@of.gold",
+        "password": "password", "name_first": "arthur", "name_last": "dent", "sessions": [],
+        "total_sessions": 1, "is_active": True}
+    channel = {"channel_id": 0, "name": "Humanity", "is_public": True, "owner_members": [user],
+        "all_members": [user], "messages": [{"message_id": 0, "user_id": 0, "message": "hi", "time_sent": 0}]}
+    data_store.set({'users': [user], 'channels': [channel], 'dms': [], 'dm_count': 0, 'message_count': 1})
+    upgraded = data_store.get()
+    assert isinstance(upgraded["users"][0], User) and upgraded["users"][0] == user
+    assert isinstance(upgraded["channels"][0], Channel)
+    assert upgraded["channels"][0]["messages"] == [Message(0, 0, "hi", 0)]
+    assert data_store.user_by_handle("arthurdent") is upgraded["users"][0]
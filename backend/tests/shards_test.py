@@ -0,0 +1,124 @@
+import os
+import pytest
+from src.data_store import data_store
+from src.persistence import save_persistence
+from src.shards import ShardStore
+from tests.conftest import restart
+from src.auth import auth_register_v1
+from src.channels import channels_create_v1
+from src.channel import channel_join_v1, channel_messages_v1
+from src.dm import dm_create, dm_remove, message_senddm
+from src.message import message_send, message_edit
+from src.error import InputError
+from src.admin import admin_user_remove_implement
+
+@pytest.fixture
+def sharded_mode(persistence_mode):
+    return persistence_mode("sharded") / "shards"
+
+@pytest.fixture
+def written(monkeypatch):
+    '''Records the shard files each save writes'''
+    paths = []
+    original = ShardStore.write
+    def write(self, blobs):
+        paths.extend(os.path.basename(path) for path, data in blobs.items() if data is not None)
+        original(self, blobs)
+    monkeypatch.setattr(ShardStore, "write", write)
+    return paths
+
+def test_message_send_rewrites_only_its_channel(sharded_mode, written):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    for name in ["one", "two", "three"]:
+        channels_create_v1(owner["auth_user_id"], name, True)
+    save_persistence()
+    written.clear()
+
+    message_send(owner["auth_user_id"], 1, "hello")
+    save_persistence()
+    assert sorted(written) == ["channel_1.messages.p", "channel_1.p", "counters.p"]
+
+    written.clear()
+    message_edit(owner["auth_user_id"], 0, "edited")
+    save_persistence()
+    assert sorted(written) == ["channel_1.messages.p", "channel_1.p"]
+
+def test_sharded_round_trip(sharded_mode):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)
+    channel_join_v1(member["auth_user_id"], channel["channel_id"])
+    message_send(member["auth_user_id"], channel["channel_id"], "hello")
+    dm = dm_create(data_store.get()["users"][0], [member["auth_user_id"]])
+    message_senddm(member["auth_user_id"], dm["dm_id"], "psst")
+    gone = dm_create(data_store.get()["users"][0], [])
+    save_persistence()
+    dm_remove(data_store.get()["users"][0], gone["dm_id"])
+    admin_user_remove_implement(member["auth_user_id"])
+    save_persistence()
+
+    assert sorted(os.listdir(sharded_mode)) == [
+        "channel_0.messages.p", "channel_0.p", "counters.p", "dm_0.messages.p", "dm_0.p", "users.p"
+    ]
+    before = restart()
+    store = data_store.get()
+    for chat in list(store["channels"].values()) + list(store["dms"].values()):
+        data_store.messages(chat)
+    assert store == before
+    assert list(store["channels"][0]["all_members"])[0] == 0
+
+def test_restart_defers_message_loading(sharded_mode, written):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    for name in ["one", "two", "three"]:
+        channel = channels_create_v1(owner["auth_user_id"], name, True)
+        message_send(owner["auth_user_id"], channel["channel_id"], name)
+    save_persistence()
+
+    restart()
+    assert not any("messages" in chat for chat in data_store.get()["channels"].values())
+    assert data_store.deferred_chats == 3
+
+    messages = channel_messages_v1(owner["auth_user_id"], 1, 0)["messages"]
+    assert [message["message"] for message in messages] == ["two"]
+    assert data_store.materialised_chats == 1
+
+    written.clear()
+    channel_join_v1(auth_register_v1("email@of.gold", "password", "ford", "prefect")["auth_user_id"], 2)
+    save_persistence()
+    assert sorted(written) == ["channel_2.p", "users.p"]
+
+def test_message_lookup_loads_only_its_chat(sharded_mode):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")["auth_user_id"]
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")["auth_user_id"]
+    for name in ["one", "two", "three"]:
+        channel = channels_create_v1(owner, name, True)["channel_id"]
+        message_send(owner, channel, name)
+    channel_join_v1(member, 2)
+    message_send(member, 2, "hello")
+    save_persistence()
+    restart()
+
+    with pytest.raises(InputError):
+        message_edit(owner, 99, "missing")
+    assert data_store.materialised_chats == 0
+    message_edit(owner, 1, "edited")
+    assert data_store.materialised_chats == 1
+    admin_user_remove_implement(member)
+    assert data_store.materialised_chats == 2
+    assert "messages" not in data_store.get()["channels"][0]
+
+def test_whole_store_save_keeps_unloaded_messages(sharded_mode):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)["channel_id"]
+    message_send(owner["auth_user_id"], channel, "hello")
+    save_persistence()
+    restart()
+
+    # user removal touches every shard, while the channel's messages were never loaded
+    admin_user_remove_implement(member["auth_user_id"])
+    save_persistence()
+    assert os.path.exists(sharded_mode / "channel_0.messages.p")
+    restart()
+    messages = channel_messages_v1(owner["auth_user_id"], channel, 0)["messages"]
+    assert [message["message"] for message in messages] == ["hello"]
@@ -0,0 +1,116 @@
+import pickle
+import pytest
+from src import config
+from src.data_store import data_store
+from src.persistence import load_persistence, save_persistence
+from src.sqlite_store import SqliteStore
+from tests.conftest import restart
+from src.auth import auth_register_v1, auth_login_v1
+from src.channels import channels_create_v1
+from src.channel import channel_join_v1, channel_invite_v1
+from src.channel_edit import channel_addowner, channel_leave
+from src.dm import dm_create, dm_leave, dm_remove, message_senddm
+from src.message import message_send, message_edit, message_remove
+from src.error import InputError
+from src.admin import admin_user_remove_implement, admin_userpermission_change_implement
+
+@pytest.fixture
+def sqlite_mode(persistence_mode):
+    return persistence_mode("sqlite")
+
+def test_sqlite_round_trip(sqlite_mode):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    third = auth_register_v1("third@of.gold", "password", "zaphod", "beeblebrox")
+    auth_login_v1("heart@of.gold", "password")
+    admin_userpermission_change_implement(third["auth_user_id"], 1)
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", False)
+    channel_invite_v1(owner["auth_user_id"], channel["channel_id"], member["auth_user_id"])
+    channel_join_v1(third["auth_user_id"], channel["channel_id"])
+    channel_addowner(data_store.get()["users"][0], channel["channel_id"], member["auth_user_id"])
+    channel_leave(owner["auth_user_id"], channel["channel_id"])
+    message_send(member["auth_user_id"], channel["channel_id"], "hello")
+    edited = message_send(third["auth_user_id"], channel["channel_id"], "typo")
+    removed = message_send(third["auth_user_id"], channel["channel_id"], "oops")
+    message_edit(third["auth_user_id"], edited["message_id"], "fixed")
+    message_remove(third["auth_user_id"], removed["message_id"])
+    dm = dm_create(data_store.get()["users"][0], [member["auth_user_id"], third["auth_user_id"]])
+    message_senddm(member["auth_user_id"], dm["dm_id"], "psst")
+    dm_leave(owner["auth_user_id"], dm["dm_id"])
+    gone = dm_create(data_store.get()["users"][1], [])
+    dm_remove(data_store.get()["users"][1], gone["dm_id"])
+    admin_user_remove_implement(member["auth_user_id"])
+    save_persistence()
+
+    before = restart()
+    store = data_store.get()
+    assert data_store.deferred_chats == 2 and data_store.materialised_chats == 0
+    for chat in list(store["channels"].values()) + list(store["dms"].values()):
+        data_store.messages(chat)
+    assert data_store.materialised_chats == 2
+    assert store == before
+    assert list(store["channels"][0]["all_members"])[0] == 2
+
+def test_sqlite_writes_only_touched_rows(sqlite_mode):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)
+    save_persistence()
+
+    statements = []
+    sqlite = SqliteStore(config.sqlite_path)
+    sqlite.db.set_trace_callback(statements.append)
+    sqlite.apply([{"op": "message_send", "chats": "channels", "chat_id": channel["channel_id"],
+        "message": {"message_id": 0, "user_id": 0, "message": "hi", "time_sent": 0}}])
+    sqlite.close()
+    assert not any("users" in statement or "members" in statement for statement in statements)
+
+def test_sqlite_imports_existing_pickle(persistence_mode, monkeypatch):
+    persistence_mode("pickle")
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    channel = channels_create_v1(owner["auth_user_id"], "Humanity", True)
+    message_send(owner["auth_user_id"], channel["channel_id"], "hello")
+    save_persistence()
+
+    monkeypatch.setattr(config, "persistence", "sqlite")
+    monkeypatch.setattr(config, "lazy_messages", False)
+    before = restart()
+    assert data_store.get() == before
+
+def test_sqlite_imports_list_format_pickle(persistence_mode, monkeypatch):
+    persistence_mode("pickle")
+    user = {"user_id": 0, "user_handle": "arthurdent", "is_owner": True, "email": "heart@of.gold",
+        "password": "password", "name_first": "arthur", "name_last": "dent", "sessions": [],
+        "total_sessions": 1, "is_active": True}
+    channel = {"channel_id": 0, "name": "Humanity", "is_public": True, "owner_members": [user],
+        "all_members": [user], "messages": [
+            {"message_id": 1, "user_id": 0, "message": "second", "time_sent": 1},
+            {"message_id": 0, "user_id": 0, "message": "first", "time_sent": 0},
+        ]}
+    with open(config.datastore_path, "wb") as FILE:
+        pickle.dump({"users": [user], "channels": [channel], "dms": [], "dm_count": 0, "message_count": 2}, FILE)
+
+    monkeypatch.setattr(config, "persistence", "sqlite")
+    load_persistence()
+    chat = data_store.get()["channels"][0]
+    assert list(chat["all_members"]) == [0]
+    assert [message["message"] for message in data_store.all_messages(chat)] == ["first", "second"]
+
+def test_message_lookup_loads_only_its_chat(sqlite_mode):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")["auth_user_id"]
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")["auth_user_id"]
+    for name in ["one", "two", "three"]:
+        channel = channels_create_v1(owner, name, True)["channel_id"]
+        message_send(owner, channel, name)
+    channel_join_v1(member, 2)
+    message_send(member, 2, "hello")
+    save_persistence()
+    restart()
+
+    with pytest.raises(InputError):
+        message_edit(owner, 99, "missing")
+    assert data_store.materialised_chats == 0
+    message_edit(owner, 1, "edited")
+    assert data_store.materialised_chats == 1
+    admin_user_remove_implement(member)
+    assert data_store.materialised_chats == 2
+    assert "messages" not in data_store.get()["channels"][0]
@@ -0,0 +1,51 @@
+import pytest
+from src import config
+from src.data_store import data_store
+from src.token import decode, encode, forget_session, decoded_tokens, session_tokens, token_cache_stats
+from src.error import AccessError
+from src.other import clear_v1
+from src.auth import auth_register_v1, auth_login_v1
+from src.admin import admin_user_remove_implement
+
+@pytest.fixture
+def store():
+    clear_v1()
+    decoded_tokens.clear()
+    session_tokens.clear()
+    yield data_store.get()
+    clear_v1()
+
+def test_repeated_token_decoded_once(store):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    misses, hits = token_cache_stats["misses"], token_cache_stats["hits"]
+    user_data = decode(owner["token"])
+    assert decode(owner["token"]) is user_data
+    assert token_cache_stats["misses"] == misses + 1 and token_cache_stats["hits"] == hits + 1
+    with pytest.raises(AccessError):
+        decode(owner["token"] + "x")
+
+def test_cache_bounded(store, monkeypatch):
+    monkeypatch.setattr(config, "token_cache_size", 2)
+    tokens = [encode({"user_id": n, "session": "session"}) for n in range(3)]
+    for token in tokens:
+        decode(token)
+    decode(tokens[1])
+    newest = encode({"user_id": 3, "session": "session"})
+    decode(newest)
+    assert list(decoded_tokens) == [tokens[1], newest]
+    # evicted tokens leave the session index too
+    assert session_tokens == {(1, "session"): {tokens[1]: None}, (3, "session"): {newest: None}}
+
+def test_removed_sessions_forgotten(store):
+    owner = auth_register_v1("heart@of.gold", "password", "arthur", "dent")
+    member = auth_register_v1("email@of.gold", "password", "ford", "prefect")
+    login = auth_login_v1("email@of.gold", "password")
+    for token in (owner["token"], member["token"], login["token"]):
+        decode(token)
+
+    user_data = decode(owner["token"])
+    forget_session(user_data["user_id"], user_data["session"])
+    assert owner["token"] not in decoded_tokens
+    admin_user_remove_implement(member["auth_user_id"])
+    assert list(decoded_tokens) == []
+    assert session_tokens == {}
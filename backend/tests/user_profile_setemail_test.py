@@ -37,6 +37,16 @@ def test_setemail_email_already_in_use(reset_data, register_valid, register_seco
     setemail2 = user_profile_setemail_t(register_second["token"], "heart@of.gold")
     assert setemail2.status_code == InputError.code
 
+def test_setemail_change_case_of_own_email(reset_data, register_valid):
+    setemail = user_profile_setemail_t(register_valid["token"], "Heart@Of.Gold")
+    assert setemail.status_code == 200
+    profile = user_profile_t(register_valid["token"], register_valid["auth_user_id"]).json()
+    assert profile["user"]["email"] == "Heart@Of.Gold"
+
+def test_setemail_same_as_own_email(reset_data, register_valid):
+    setemail = user_profile_setemail_t(register_valid["token"], "heart@of.gold")
+    assert setemail.status_code == InputError.code
+
 def test_setemail_invalid_token(reset_data, register_valid):
     handle = user_profile_setemail_t(register_valid["token"] + "DEADBEEF", "hello@bye.com")
     assert handle.status_code == AccessError.code
\ No newline at end of file